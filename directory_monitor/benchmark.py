@@ -0,0 +1,192 @@
+import argparse, json, os, platform, random, shutil, statistics, subprocess, sys, tempfile, logging
+import file_handler, json_config, support_funcions
+from datetime import datetime
+from time import perf_counter
+from classes import ConfigurationValues, PathDetails, TtkGeometry
+from result_channel import ResultChannel
+
+logger = logging.getLogger('benchmark')
+
+
+def build_tree(root: str, file_count: int, extensions: dict, ignore_rate: float, ignore_prefix: str='IGN_', subdirs: int=0, seed: int=0) -> None:
+    r'''
+    Create file_count empty files in root, spread over subdirs sub directories if informed (root itself stays empty)
+    extensions is {extension : weight}, ignore_rate the share of names starting with ignore_prefix
+    '''
+    generator = random.Random(seed)
+    extension_list = list(extensions.keys())
+    weights = list(extensions.values())
+    directories = [os.path.join(root, f'sub_{index:03d}') for index in range(subdirs)] or [root]
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+    chosen = generator.choices(extension_list, weights=weights, k=file_count)
+    for index, extension in enumerate(chosen):
+        prefix = ignore_prefix if generator.random() < ignore_rate else 'FILE_'
+        directory = directories[index % len(directories)]
+        os.close(os.open(os.path.join(directory, f'{prefix}{index:07d}.{extension}'), os.O_CREAT | os.O_WRONLY, 0o644))
+
+
+def time_call(function, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+    return {'repeat' : repeat, 'min' : min(times), 'median' : statistics.median(times), 'mean' : statistics.mean(times)}
+
+
+def run_case(root: str, tree_root: str | None, file_count: int, extension: str, ignore_pattern: str, repeat: int) -> list:
+    r'''
+    Time the flat directory functions on root and the recursive helpers on tree_root
+    '''
+    path_value = PathDetails('Benchmark', root, extension, ignore_pattern, 'poll')
+    config = ConfigurationValues(10, {}, False, [path_value])
+    channel = ResultChannel()
+    results = []
+
+    def add(function_name: str, function):
+        result = time_call(function, repeat)
+        result.update({'function' : function_name, 'files' : file_count})
+        results.append(result)
+        logger.info(f'{file_count:>9} files {function_name:<45} median {result["median"] * 1000:10.3f}ms')
+
+    def update_count_cold():
+        support_funcions.path_cache.clear()
+        support_funcions.update_count(config, channel)
+        channel.drain()
+
+    def update_count_warm():
+        support_funcions.update_count(config, channel)
+        channel.drain()
+
+    add('file_handler.file_list', lambda: file_handler.file_list(root, extension))
+    add('file_handler.count_files', lambda: file_handler.count_files(root, extension, path_value.ignore_regex))
+    add('file_handler.file_stats', lambda: file_handler.file_stats(root, extension, path_value.ignore_regex))
+    add('support_funcions.update_count (cold cache)', update_count_cold)
+    update_count_cold()
+    add('support_funcions.update_count (warm cache)', update_count_warm)
+    add('file_handler.file_entry_batches (list view)', lambda: [file_entry for batch in file_handler.file_entry_batches(root, extension) for file_entry in batch])
+    if tree_root:
+        add('file_handler.listFilesInDirSubDir', lambda: file_handler.listFilesInDirSubDir(tree_root, extension))
+        add('file_handler.listFilesInDirSubDirWithDate', lambda: file_handler.listFilesInDirSubDirWithDate(tree_root, extension))
+        add('file_handler.listFilesInDirSubDirByDate', lambda: file_handler.listFilesInDirSubDirByDate(tree_root, extension))
+    return results
+
+
+def run_config_case(path_count: int, repeat: int) -> list:
+    r'''
+    Configuration load (json + check_type_insertion) and save (to_dict + json) with path_count paths
+    '''
+    geometry = {name : TtkGeometry('', '', 0, 0) for name in ('main', 'settings', 'edit', 'list_view')}
+    config = ConfigurationValues(10, geometry, False, [PathDetails(f'Path {index}', f'./path_{index}', 'pdf', '^IGN_') for index in range(path_count)])
+    config_file = os.path.join(tempfile.mkdtemp(prefix='dm_bench_config_'), 'config.json')
+    json_config.save_json_config(config_file, ConfigurationValues.check_type_insertion(config.to_dict()).to_dict())
+    try:
+        results = []
+        for function_name, function in (
+            ('config load', lambda: ConfigurationValues.check_type_insertion(json_config.load_json_config(config_file))),
+            ('config save', lambda: json_config.save_json_config(config_file, ConfigurationValues.check_type_insertion(json_config.load_json_config(config_file)).to_dict()))):
+            result = time_call(function, repeat)
+            result.update({'function' : function_name, 'files' : path_count})
+            results.append(result)
+            logger.info(f'{path_count:>9} paths {function_name:<45} median {result["median"] * 1000:10.3f}ms')
+        return results
+    finally:
+        shutil.rmtree(os.path.dirname(config_file), ignore_errors=True)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(old_file: str, new_file: str) -> None:
+    r'''
+    Print median ratio new / old for each function and size found in both files
+    '''
+    with open(old_file, encoding='utf-8') as old_data, open(new_file, encoding='utf-8') as new_data:
+        old_report, new_report = json.load(old_data), json.load(new_data)
+    old_results = {(result['function'], result['files']) : result for result in old_report['results']}
+    print(f'{old_report.get("commit")} -> {new_report.get("commit")}')
+    for result in new_report['results']:
+        old_result = old_results.get((result['function'], result['files']))
+        if old_result and old_result['median']:
+            print(f'{result["files"]:>9} {result["function"]:<45} {old_result["median"] * 1000:10.3f}ms -> {result["median"] * 1000:10.3f}ms  x{result["median"] / old_result["median"]:.2f}')
+
+
+def parse_extensions(text: str) -> dict:
+    r'''
+    'pdf:0.7,txt:0.3' to {'pdf' : 0.7, 'txt' : 0.3}
+    '''
+    extensions = {}
+    for item in text.split(','):
+        name, _, weight = item.partition(':')
+        extensions[name.strip()] = float(weight or 1)
+    return extensions
+
+
+def main(argv: list | None=None) -> None:
+    r'''
+    Benchmark
+    ---------
+
+    Generates temporary directories with synthetic files and times the listing,
+    counting, list view loading and configuration functions. Results are written as JSON
+    to compare across commits.
+
+        python benchmark.py --sizes 1000 10000 100000 --output bench_output.json
+        python benchmark.py --sizes 1000000 --repeat 1
+        python benchmark.py --compare old.json new.json
+    '''
+    parser = argparse.ArgumentParser(description='Directory Monitor benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='file counts, up to 1000000')
+    parser.add_argument('--extensions', default='pdf:0.7,txt:0.2,tmp:0.1', help='extension mix as ext:weight,...')
+    parser.add_argument('--ignore-rate', type=float, default=0.1, help='share of file names matching the ignore pattern')
+    parser.add_argument('--subdirs', type=int, default=10, help='sub directories of the tree for the recursive helpers, 0 to skip them')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--config-paths', type=int, default=200, help='paths in the configuration load/save case')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files and exit')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # Keep per listing messages of the recursive helpers out of the report
+    logging.getLogger('file_handler').setLevel(logging.WARNING)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    extensions = parse_extensions(args.extensions)
+    extension = next(iter(extensions))
+    results = []
+    for size in args.sizes:
+        root = tempfile.mkdtemp(prefix='dm_bench_')
+        try:
+            flat_root = os.path.join(root, 'flat')
+            tree_root = os.path.join(root, 'tree') if args.subdirs else None
+            logger.info(f'Building {size} files in {root}')
+            build_tree(flat_root, size, extensions, args.ignore_rate)
+            if tree_root:
+                build_tree(tree_root, size, extensions, args.ignore_rate, subdirs=args.subdirs)
+            results += run_case(flat_root, tree_root, size, extension, '^IGN_', args.repeat)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    results += run_config_case(args.config_paths, args.repeat)
+
+    report = {
+        'commit' : git_commit(),
+        'timestamp' : datetime.now().isoformat(timespec='seconds'),
+        'python' : sys.version.split()[0],
+        'platform' : platform.platform(),
+        'parameters' : {'extensions' : extensions, 'ignore_rate' : args.ignore_rate, 'subdirs' : args.subdirs, 'repeat' : args.repeat},
+        'results' : results
+    }
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump(report, output, indent=4)
+    logger.info(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
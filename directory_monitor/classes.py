@@ -1,5 +1,5 @@
-import logging
-from dataclasses import dataclass
+import logging, re
+from dataclasses import dataclass, fields
 from os.path import normpath
 from collections import namedtuple
 
@@ -8,28 +8,67 @@ logger = logging.getLogger()
 
 
 TtkGeometry = namedtuple('TtkGeometry', 'width, height, x, y')
+MONITOR_MODES = ('watch', 'poll')
 
 
 @dataclass
 class PathDetails:
     r'''
-    Path details with path, file extension, and ignore pattern
+    Path details with path, file extension, ignore pattern and monitor mode
+
+    monitor_mode
+        watch   updated from file system events (inotify) when available
+        poll    listed again on its own schedule
+
+    min_interval, max_interval
+        polling interval bounds in seconds, min_interval 0 uses update_time,
+        max_interval 0 keeps polling at min_interval (no back off while unchanged)
+    priority
+        paths due at the same time are scanned higher priority first
+    recursive
+        count matching files in every sub directory too, always polled
     '''
     name : str
     path: str
     extension: str
     ignore: str
+    monitor_mode: str = 'watch'
+    min_interval: int = 0
+    max_interval: int = 0
+    priority: int = 0
+    recursive: bool = False
+
+
+    def __setattr__(self, name: str, value) -> None:
+        super().__setattr__(name, value)
+        # Compile the ignore pattern once, again only when it changes
+        if name == 'ignore':
+            super().__setattr__('_ignore_regex', re.compile(value) if value else None)
+            super().__setattr__('_ignore_error', None)
 
 
     def __eq__(self, other) -> bool:
         if not isinstance(other, self.__class__):
             return NotImplemented
         else:
-            self_values = self.__dict__
-            for key in self_values.keys():
-                if not getattr(self, key) == getattr(other, key):
+            for field in fields(self):
+                if not getattr(self, field.name) == getattr(other, field.name):
                     return False
             return True
+
+
+    @property
+    def ignore_regex(self) -> re.Pattern | None:
+        r'''
+        Compiled ignore pattern, raises re.error if the pattern loaded from the configuration is invalid
+        '''
+        if self._ignore_error is not None:
+            raise self._ignore_error
+        return self._ignore_regex
+
+
+    def to_dict(self) -> dict:
+        return {field.name : getattr(self, field.name) for field in fields(self)}
     
 
     @classmethod
@@ -39,7 +78,23 @@ class PathDetails:
             path =  normpath(config_values['path'])
             extension = config_values['extension']
             ignore = config_values['ignore']
-            return cls(name, path, extension, ignore)
+            monitor_mode = config_values.get('monitor_mode', 'watch')
+            if not monitor_mode in MONITOR_MODES:
+                raise ValueError(f'Invalid monitor mode {monitor_mode} for {name}')
+            min_interval = int(config_values.get('min_interval', 0))
+            max_interval = int(config_values.get('max_interval', 0))
+            priority = int(config_values.get('priority', 0))
+            recursive = config_values.get('recursive', False)
+            recursive = recursive in ('True', 'true', '1') if type(recursive) == str else bool(recursive)
+            try:
+                return cls(name, path, extension, ignore, monitor_mode, min_interval, max_interval, priority, recursive)
+            except re.error as error:
+                # Keep the path so the other paths run and the configuration is saved as it was,
+                # only its scans fail until the pattern is fixed
+                logger.error(f'Invalid ignore pattern {ignore} for {name} ({error})')
+                path_details = cls(name, path, extension, '', monitor_mode, min_interval, max_interval, priority, recursive)
+                path_details.__dict__.update(ignore=ignore, _ignore_error=error)
+                return path_details
         except Exception as error:
             raise error
 
@@ -48,11 +103,19 @@ class PathDetails:
 class ConfigurationValues:
     r'''
     Configuration for path list
+    scan_workers above 1 lists the paths concurrently
+    metrics_port above 0 serves metrics on http://127.0.0.1:metrics_port/metrics
+    age_warning, age_critical minutes since the oldest file of a path was modified
+    to highlight its row, 0 disables
     '''
     update_time : int
     list_geometry : dict
     always_on_top: bool
     path_list: list
+    scan_workers: int = 1
+    metrics_port: int = 0
+    age_warning: int = 0
+    age_critical: int = 0
 
 
     def __eq__(self, other) -> bool:
@@ -70,7 +133,7 @@ class ConfigurationValues:
         values_dict = self.__dict__
         values_dict['list_geometry'] = {name : [*value] for name, value in values_dict['list_geometry'].items()}
         values_dict['always_on_top'] = str(values_dict['always_on_top'])
-        values_dict['path_list'] = [value.__dict__ for value in values_dict['path_list']]
+        values_dict['path_list'] = [value.to_dict() for value in values_dict['path_list']]
         return values_dict
 
 
@@ -88,9 +151,37 @@ class ConfigurationValues:
             list_geometry = {name : TtkGeometry(*value) for name, value in config_values['list_geometry'].items()}
             always_on_top = eval(config_values['always_on_top']) if type(config_values['always_on_top']) == str else config_values['always_on_top']
             path_list = [PathDetails.check_type_insertion(path_parameters) for path_parameters in config_values['path_list']]
-            return cls(update_time, list_geometry, always_on_top, path_list)
+            scan_workers = max(1, int(config_values.get('scan_workers', 1)))
+            metrics_port = int(config_values.get('metrics_port', 0))
+            age_warning = int(config_values.get('age_warning', 0))
+            age_critical = int(config_values.get('age_critical', 0))
+            return cls(update_time, list_geometry, always_on_top, path_list, scan_workers, metrics_port, age_warning, age_critical)
         except Exception as error:
             raise error
 
 
-
+@dataclass
+class CountEvent:
+    r'''
+    Count result of a path scan
+    duration in seconds, timestamp in epoch seconds
+    breakdown {relative sub directory : count} of recursive paths, None otherwise
+    total_size in bytes, oldest_mtime and newest_mtime in epoch seconds of the counted files,
+    None for counts updated from events (or mtimes of an empty directory)
+    taken by the last listing, files written in place show up within STATS_MAX_AGE seconds
+    arrival_rate, departure_rate files in and out per minute, None for counts updated from
+    events or before the rates are known
+    offline_changes (files added, files removed) while the monitor was stopped, only in the
+    warm start count of a path that changed since its stored snapshot
+    '''
+    path_name: str
+    count: int
+    duration: float
+    timestamp: float
+    breakdown: dict | None = None
+    total_size: int | None = None
+    oldest_mtime: float | None = None
+    newest_mtime: float | None = None
+    arrival_rate: float | None = None
+    departure_rate: float | None = None
+    offline_changes: tuple | None = None
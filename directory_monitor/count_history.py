@@ -0,0 +1,99 @@
+import logging, file_handler
+from array import array
+from datetime import datetime
+
+logger = logging.getLogger('count_history')
+
+
+# Samples kept per path, one per displayed count (each poll, at most one per GUI tick for
+# watched paths), about 4 hours at the default 10 second update time, less on busy watched paths
+HISTORY_CAPACITY = 1440
+SPARK_CHARACTERS = '▁▂▃▄▅▆▇█'
+
+
+class CountHistory:
+    r'''
+    Count History
+    -------------
+
+    Last capacity (timestamp, count) samples of a path in two preallocated arrays
+    used as a ring buffer, 16 bytes a sample whatever the run time.
+    '''
+    def __init__(self, capacity: int=HISTORY_CAPACITY) -> None:
+        self.capacity = capacity
+        self.timestamps = array('d', [0.0]) * capacity
+        self.counts = array('q', [0]) * capacity
+        self.next_index = 0
+        self.size = 0
+
+
+    def __len__(self) -> int:
+        return self.size
+
+
+    def append(self, timestamp: float, count: int) -> None:
+        self.timestamps[self.next_index] = timestamp
+        self.counts[self.next_index] = count
+        self.next_index = (self.next_index + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+
+    def samples(self, last: int | None=None) -> list:
+        r'''
+        (timestamp, count) oldest first, only the last samples if informed
+        '''
+        size = self.size if last is None else min(last, self.size)
+        start = (self.next_index - size) % self.capacity
+        return [(self.timestamps[(start + offset) % self.capacity], self.counts[(start + offset) % self.capacity]) for offset in range(size)]
+
+
+    def sparkline(self, width: int=20) -> str:
+        r'''
+        Last width counts as block characters scaled between their minimum and maximum
+        '''
+        counts = [count for _, count in self.samples(width)]
+        if not counts:
+            return ''
+        low, high = min(counts), max(counts)
+        if low == high:
+            return SPARK_CHARACTERS[0] * len(counts)
+        scale = (len(SPARK_CHARACTERS) - 1) / (high - low)
+        return ''.join(SPARK_CHARACTERS[round((count - low) * scale)] for count in counts)
+
+
+class HistoryRegistry:
+    r'''
+    CountHistory of each path name, created on the first sample
+    '''
+    def __init__(self, capacity: int=HISTORY_CAPACITY) -> None:
+        self.capacity = capacity
+        self.histories = {}
+
+
+    def record(self, path_name: str, timestamp: float, count: int) -> CountHistory:
+        history = self.histories.get(path_name)
+        if history is None:
+            history = self.histories[path_name] = CountHistory(self.capacity)
+        history.append(timestamp, count)
+        return history
+
+
+    def get(self, path_name: str) -> CountHistory | None:
+        return self.histories.get(path_name)
+
+
+    def remove(self, path_name: str) -> None:
+        self.histories.pop(path_name, None)
+
+
+    def export_csv(self, file_path: str) -> int:
+        r'''
+        Write every sample as PATH, TIMESTAMP, COUNT rows, return the number of rows
+        Samples are not evenly spaced, use the timestamps for the time axis
+        '''
+        rows = [{'PATH' : path_name, 'TIMESTAMP' : datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S'), 'COUNT' : count}
+            for path_name, history in self.histories.items() for timestamp, count in history.samples()]
+        if rows:
+            file_handler.listToCSV(rows, file_path)
+        logger.info(f'{len(rows)} history samples exported to {file_path}')
+        return len(rows)
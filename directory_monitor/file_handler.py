@@ -1,10 +1,15 @@
-import csv, os, shutil, datetime, time, chardet, logging, sys
+import csv, os, shutil, datetime, time, logging, sys
 from os.path import abspath, normpath
 from ntpath import join
+from collections import namedtuple
 
 logger = logging.getLogger('file_handler')
 
 
+FileStats = namedtuple('FileStats', 'count, total_size, oldest_mtime, newest_mtime')
+FileEntry = namedtuple('FileEntry', 'name, mtime, size')
+
+
 def file_list(path=str, file_extention=str) -> list:
     '''
     List files ended with choosen extension inside one directory
@@ -15,6 +20,184 @@ def file_list(path=str, file_extention=str) -> list:
     return [file for file in os.listdir(path) if file.lower().endswith(f'.{file_extention.lower()}')]
 
 
+def count_files(path: str, file_extention: str, ignore_regex=None) -> int:
+    '''
+    Count files ended with choosen extension and not matching the compiled ignore regex
+    Entries are streamed from os.scandir, no list of names is built
+    The filter is inlined instead of using __matching_entries, the generator cost a third of the time
+    '''
+    if not os.path.exists(path):
+        os.makedirs(path)
+        logger.info(f'Directory {path} created')
+    extension = f'.{file_extention.lower()}'
+    count = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.lower().endswith(extension) and (ignore_regex is None or not ignore_regex.search(name)):
+                count += 1
+    return count
+
+
+def matching_names(path: str, file_extention: str, ignore_regex=None) -> list:
+    '''
+    Names counted by count_files
+    '''
+    return [entry.name for entry in __matching_entries(path, file_extention, ignore_regex)]
+
+
+def file_stats_subdirs(path: str, file_extention: str, ignore_regex=None, keys: set | None=None) -> tuple:
+    '''
+    Same as file_stats returning (FileStats, sub directory paths) from the same scandir pass
+    The directory is not created and links to directories are not followed
+    '''
+    extension = f'.{file_extention.lower()}'
+    subdirectories = []
+    matching = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+                continue
+            name = entry.name
+            if name.lower().endswith(extension) and (ignore_regex is None or not ignore_regex.search(name)):
+                matching.append(entry)
+    return __entries_stats(matching, keys), subdirectories
+
+
+def file_stats_staged(path: str, file_extention: str, ignore_regex=None, keys: set | None=None, names: set | None=None) -> tuple:
+    '''
+    Same result as file_stats, one stage at a time to time each of them
+    Builds the entry list, meant for tracing only
+    Return (FileStats, {stage : seconds}) with list, extension, ignore and stat stages
+    '''
+    start = time.perf_counter()
+    if not os.path.exists(path):
+        os.makedirs(path)
+        logger.info(f'Directory {path} created')
+    with os.scandir(path) as entries:
+        entry_list = list(entries)
+    listed = time.perf_counter()
+    extension = f'.{file_extention.lower()}'
+    entry_list = [entry for entry in entry_list if entry.name.lower().endswith(extension)]
+    filtered = time.perf_counter()
+    if ignore_regex is not None:
+        entry_list = [entry for entry in entry_list if not ignore_regex.search(entry.name)]
+    ignored = time.perf_counter()
+    stats = __entries_stats(entry_list, keys, names)
+    return stats, {'list' : listed - start, 'extension' : filtered - listed, 'ignore' : ignored - filtered, 'stat' : time.perf_counter() - ignored}
+
+
+def file_stats(path: str, file_extention: str, ignore_regex=None, keys: set | None=None, names: set | None=None) -> FileStats:
+    '''
+    Same as count_files with total size, oldest and newest modification time, in the same scandir pass
+    Uses the DirEntry stat, cached by scandir on Windows (one stat call per file elsewhere)
+    keys, if informed, receives hash((inode, name)) of each counted file, names its name
+    '''
+    if not os.path.exists(path):
+        os.makedirs(path)
+        logger.info(f'Directory {path} created')
+    extension = f'.{file_extention.lower()}'
+    with os.scandir(path) as entries:
+        return __entries_stats((entry for entry in entries if entry.name.lower().endswith(extension) and (ignore_regex is None or not ignore_regex.search(entry.name))), keys, names)
+
+
+def __entries_stats(entries, keys: set | None=None, names: set | None=None) -> FileStats:
+    '''
+    Auxiliary method, FileStats of DirEntry iterable, adding the counted file keys and names if informed
+    Files removed before their stat are not counted
+    '''
+    count = 0
+    total_size = 0
+    oldest_mtime = None
+    newest_mtime = None
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        count += 1
+        total_size += stat.st_size
+        if keys is not None:
+            keys.add(hash((stat.st_ino, entry.name)))
+        if names is not None:
+            names.add(entry.name)
+        mtime = stat.st_mtime
+        if oldest_mtime is None or mtime < oldest_mtime:
+            oldest_mtime = mtime
+        if newest_mtime is None or mtime > newest_mtime:
+            newest_mtime = mtime
+    return FileStats(count, total_size, oldest_mtime, newest_mtime)
+
+
+def merge_file_stats(stats_list) -> FileStats:
+    '''
+    FileStats of several directories together
+    '''
+    count = 0
+    total_size = 0
+    oldest_list = []
+    newest_list = []
+    for stats in stats_list:
+        count += stats.count
+        total_size += stats.total_size
+        if stats.oldest_mtime is not None:
+            oldest_list.append(stats.oldest_mtime)
+            newest_list.append(stats.newest_mtime)
+    return FileStats(count, total_size, min(oldest_list, default=None), max(newest_list, default=None))
+
+
+def directory_signature(path: str) -> tuple | None:
+    '''
+    (st_mtime_ns, st_ino) of the directory, changed by creating, deleting or renaming an entry
+    None if the directory does not exist
+    '''
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_ino)
+
+
+def file_entry_batches(path: str, file_extention: str, ignore_regex=None, batch_size: int=1000):
+    '''
+    Generator of FileEntry lists (name, st_mtime, st_size) of up to batch_size files
+    Same extension rule as file_list, stat data taken from the DirEntry
+    Files removed while listing are skipped
+    '''
+    batch = []
+    for entry in __matching_entries(path, file_extention, ignore_regex):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        batch.append(FileEntry(entry.name, stat.st_mtime, stat.st_size))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def __matching_entries(path: str, file_extention: str, ignore_regex=None):
+    '''
+    Auxiliary generator for file_entry_batches and matching_names
+    Same extension rule as file_list, filtered while streaming
+    '''
+    if not os.path.exists(path):
+        os.makedirs(path)
+        logger.info(f'Directory {path} created')
+    extension = f'.{file_extention.lower()}'
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.lower().endswith(extension):
+                continue
+            if ignore_regex is not None and ignore_regex.search(name):
+                continue
+            yield entry
+
+
 def listFilesInDirSubDir(pathRoot: str, extention: str='') -> list:
     '''
     List files ended with choosen extension inside all directories inside the path
@@ -90,6 +273,7 @@ def __detect_encode(file_path):
     Auxiliary method for CSVoList
     Try to detect the encoding type
     '''
+    import chardet      # Only needed for csv files with unknown encoding
     logger.debug('Try to find best tuited encode for data')
     with open(file_path, 'rb') as rawdata:
         result = chardet.detect(rawdata.read(100000))
@@ -0,0 +1,132 @@
+import logging
+from array import array
+from math import exp
+from threading import Lock
+
+logger = logging.getLogger('flow_rates')
+
+
+# EWMA time constant in seconds, a sample older than this weighs about a third of a new one
+RATE_TIME_CONSTANT = 300
+
+
+class FlowRate:
+    r'''
+    Flow Rate
+    ---------
+
+    Files in and files out per minute of a path, smoothed by an exponentially weighted
+    moving average. The weight of each sample follows the time elapsed since the previous
+    one, so scans at irregular intervals (adaptive polling) are averaged over time.
+    '''
+    def __init__(self, time_constant: float=RATE_TIME_CONSTANT) -> None:
+        self.time_constant = time_constant
+        self.timestamp = None
+        self.arrival_rate = None
+        self.departure_rate = None
+
+
+    def update(self, arrived: int, departed: int, timestamp: float) -> None:
+        elapsed = timestamp - self.timestamp if self.timestamp is not None else 0
+        self.timestamp = timestamp
+        if elapsed <= 0:
+            return
+        arrival_sample = arrived * 60 / elapsed
+        departure_sample = departed * 60 / elapsed
+        if self.arrival_rate is None:
+            self.arrival_rate, self.departure_rate = arrival_sample, departure_sample
+            return
+        weight = 1 - exp(-elapsed / self.time_constant)
+        self.arrival_rate += weight * (arrival_sample - self.arrival_rate)
+        self.departure_rate += weight * (departure_sample - self.departure_rate)
+
+
+    def restart(self, timestamp: float) -> None:
+        r'''
+        Next sample is taken from timestamp, files moved before it are unknown
+        '''
+        self.timestamp = timestamp
+
+
+    def rates(self) -> tuple | None:
+        r'''
+        (files in per minute, files out per minute), None before the first interval
+        '''
+        if self.arrival_rate is None:
+            return None
+        return self.arrival_rate, self.departure_rate
+
+
+class FlowRates:
+    r'''
+    Flow Rates
+    ----------
+
+    Arrivals and departures of each path from consecutive listings of its directories.
+    A listing is a set of hash((inode, name)) ints, one per counted file, diffed with the
+    previous listing of the same directory in one linear pass. Between scans only an
+    array of the keys is kept, 8 bytes a file instead of a set of int objects.
+    A file renamed or replaced under the same name gets a new key, leaving and arriving.
+
+    Listings only happen when a directory changed, scans reusing the cached count are an
+    interval with no arrivals or departures. Files created and removed between two listings
+    are not seen.
+    '''
+    def __init__(self, time_constant: float=RATE_TIME_CONSTANT) -> None:
+        self.time_constant = time_constant
+        self.snapshots = {}
+        self.pending = {}
+        self.flows = {}
+        self.lock = Lock()
+
+
+    def observe(self, path_name: str, directory: str, keys: set) -> None:
+        r'''
+        Diff the listing keys of one directory of path_name with its previous listing
+        The first listing of a directory only starts its snapshot
+        '''
+        with self.lock:
+            previous = self.snapshots.get((path_name, directory))
+            self.snapshots[(path_name, directory)] = array('q', keys)
+            pending = self.pending.get(path_name, (0, 0, True))
+            if previous is None:
+                self.pending[path_name] = (pending[0], pending[1], False)
+                return
+        # Keys are unique in both listings, the ones kept are the previous minus the departed
+        departed = sum(1 for key in previous if key not in keys)
+        arrived = len(keys) - (len(previous) - departed)
+        with self.lock:
+            pending = self.pending.get(path_name, (0, 0, True))
+            self.pending[path_name] = (pending[0] + arrived, pending[1] + departed, pending[2])
+
+
+    def update(self, path_name: str, timestamp: float) -> tuple | None:
+        r'''
+        End the scan of path_name, adding the observed arrivals and departures to its rates
+        Return (files in per minute, files out per minute) or None while unknown
+        '''
+        with self.lock:
+            arrived, departed, complete = self.pending.pop(path_name, (0, 0, True))
+            flow = self.flows.get(path_name)
+            if flow is None:
+                flow = self.flows[path_name] = FlowRate(self.time_constant)
+            if complete:
+                flow.update(arrived, departed, timestamp)
+            else:
+                flow.restart(timestamp)
+            return flow.rates()
+
+
+    def discard(self, path_name: str) -> None:
+        with self.lock:
+            for key in [key for key in self.snapshots.keys() if key[0] == path_name]:
+                del self.snapshots[key]
+            self.pending.pop(path_name, None)
+            self.flows.pop(path_name, None)
+
+
+    def clear(self) -> None:
+        with self.lock:
+            self.snapshots.clear()
+            self.pending.clear()
+            self.flows.clear()
@@ -1,15 +1,28 @@
-import tkinter, logging, json_config, file_handler, support_funcions
+import tkinter, logging, re, json_config, file_handler, support_funcions
 from tkinter import messagebox
 from tkinter import ttk
 from tkinter import filedialog
 from copy import deepcopy
-from classes import ConfigurationValues, PathDetails
+from itertools import accumulate, compress
+from dataclasses import replace
+from classes import ConfigurationValues, PathDetails, CountEvent, MONITOR_MODES
 from PIL import Image, ImageTk
-from os.path import normpath, exists, getmtime, join
+from os.path import normpath, exists, join
 from os import startfile
 from datetime import datetime
+from queue import Queue, Empty
+from threading import Thread, Event
+from time import time
+from snapshot_cache import settled
 logger = logging.getLogger('gui_classes')
 
+# Milliseconds without typing before the list view filter runs
+FILTER_DELAY = 250
+# List view loading, files per batch from the worker and milliseconds between batch pulls
+LOAD_BATCH_SIZE = 2000
+LOAD_PULL_INTERVAL = 50
+LOAD_PULL_BATCHES = 10
+
 
 '''
 =============================================================================================================================
@@ -19,6 +32,216 @@ logger = logging.getLogger('gui_classes')
 =============================================================================================================================
 '''
 
+class RowView:
+    r'''
+    Read only sequence of rows[indexes[position]], reversed if informed
+    Sorted and filtered orders are shown without building a list of rows
+    '''
+    def __init__(self, rows: list, indexes: list, reverse: bool=False) -> None:
+        self.rows = rows
+        self.indexes = indexes
+        self.reverse = reverse
+
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[index] for index in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self.indexes)
+        if self.reverse:
+            position = len(self.indexes) - 1 - position
+        return self.rows[self.indexes[position]]
+
+
+    def __iter__(self):
+        rows = self.rows
+        for index in (reversed(self.indexes) if self.reverse else self.indexes):
+            yield rows[index]
+
+
+class VirtualList:
+    r'''
+    Virtual List
+    ------------
+
+    Keeps every row in a Python list and only the visible window of rows, plus margin,
+    in the Treeview. The scroll bar is mapped to the whole list and the window items are
+    reused as it moves, their values replaced only when different, so the Treeview never
+    holds more than a screen of rows whatever the list size.
+
+    formatter(row) returns the values shown for a row, called only for rows in the window.
+    '''
+    def __init__(self, treeview: ttk.Treeview, scroll_bar: ttk.Scrollbar, margin: int=10, formatter=tuple) -> None:
+        self.treeview = treeview
+        self.scroll_bar = scroll_bar
+        self.margin = margin
+        self.formatter = formatter
+        self.rows = []
+        self.first = 0
+        self.items = []
+        self.item_values = {}
+        self.selected_row = None
+        self.scroll_bar.configure(command=self.yview)
+        self.treeview.configure(yscrollcommand='')
+        self.treeview.bind('<Configure>', lambda event: self.refresh())
+        self.treeview.bind('<MouseWheel>', self.__on_mouse_wheel)
+        self.treeview.bind('<Button-4>', lambda event: self.__scroll(-3))
+        self.treeview.bind('<Button-5>', lambda event: self.__scroll(3))
+        self.treeview.bind('<<TreeviewSelect>>', self.__on_select)
+        for key, step in (('<Up>', -1), ('<Down>', 1), ('<Prior>', 'page_up'), ('<Next>', 'page_down'), ('<Home>', 'home'), ('<End>', 'end')):
+            self.treeview.bind(key, lambda event, step=step: self.__on_key(step))
+
+
+    def set_rows(self, rows: list) -> None:
+        r'''
+        Replace the rows, back to the top keeping the selected row if still present
+        '''
+        self.rows = rows
+        self.first = 0
+        self.refresh()
+
+
+    def update_rows(self, rows: list, anchor_row=None) -> None:
+        r'''
+        Replace the rows after an insert or remove, keeping the position
+        anchor_row, the first row shown before the change, stays first if still present
+        '''
+        self.rows = rows
+        anchor_index = self.row_index(anchor_row)
+        if anchor_index is not None:
+            self.first = anchor_index
+        self.refresh()
+
+
+    def first_row(self):
+        return self.rows[self.first] if self.first < len(self.rows) else None
+
+
+    def visible_count(self) -> int:
+        r'''
+        Rows fitting in the Treeview height, below the heading
+        '''
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        heading_height = row_height
+        if self.items:
+            first_box = self.treeview.bbox(self.items[0])
+            if first_box:
+                heading_height = first_box[1]
+        return max(1, (self.treeview.winfo_height() - heading_height) // row_height)
+
+
+    def refresh(self) -> None:
+        r'''
+        Fill the window items with the rows from first on
+        '''
+        total = len(self.rows)
+        visible = self.visible_count()
+        self.first = max(0, min(self.first, total - visible))
+        window = self.rows[self.first:self.first + visible + self.margin]
+        while len(self.items) < len(window):
+            self.items.append(self.treeview.insert('', tkinter.END))
+        if len(self.items) > len(window):
+            removed_items = self.items[len(window):]
+            self.treeview.delete(*removed_items)
+            del self.items[len(window):]
+            for item_id in removed_items:
+                self.item_values.pop(item_id, None)
+        selected_item = None
+        for item_id, row in zip(self.items, window):
+            values = tuple(self.formatter(row))
+            if self.item_values.get(item_id) != values:
+                self.treeview.item(item_id, values=values)
+                self.item_values[item_id] = values
+            if row is self.selected_row:
+                selected_item = item_id
+        if selected_item:
+            if self.treeview.selection() != (selected_item,):
+                self.treeview.selection_set(selected_item)
+            self.treeview.focus(selected_item)
+        elif self.treeview.selection():
+            self.treeview.selection_remove(*self.treeview.selection())
+        # Items are never scrolled inside the Treeview, the window moves instead
+        self.treeview.yview_moveto(0)
+        if total:
+            self.scroll_bar.set(self.first / total, min(1, (self.first + visible) / total))
+        else:
+            self.scroll_bar.set(0, 1)
+
+
+    def yview(self, *args) -> None:
+        r'''
+        Scroll bar command, moveto fraction or scroll n units / pages
+        '''
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * len(self.rows))
+            self.refresh()
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.__scroll(step * self.visible_count() if args[2] == 'pages' else step)
+
+
+    def row_index(self, row) -> int | None:
+        r'''
+        Index of row, looked up in the window first
+        '''
+        if row is None:
+            return None
+        for index in range(self.first, min(self.first + len(self.items), len(self.rows))):
+            if self.rows[index] is row:
+                return index
+        for index, list_row in enumerate(self.rows):
+            if list_row is row:
+                return index
+        return None
+
+
+    def see(self, row_index: int) -> None:
+        visible = self.visible_count()
+        if row_index < self.first:
+            self.first = row_index
+        elif row_index >= self.first + visible:
+            self.first = row_index - visible + 1
+
+
+    def __scroll(self, step: int) -> str:
+        self.first += step
+        self.refresh()
+        return 'break'
+
+
+    def __on_mouse_wheel(self, event) -> str:
+        return self.__scroll(-3 if event.delta > 0 else 3)
+
+
+    def __on_select(self, event=None) -> None:
+        selection = self.treeview.selection()
+        if selection and selection[0] in self.items:
+            index = self.items.index(selection[0])
+            if self.first + index < len(self.rows):
+                self.selected_row = self.rows[self.first + index]
+
+
+    def __on_key(self, step) -> str:
+        if not self.rows:
+            return 'break'
+        index = self.row_index(self.selected_row)
+        if index is None:
+            index = self.first - 1
+        page = self.visible_count()
+        index = {'page_up' : index - page, 'page_down' : index + page, 'home' : 0, 'end' : len(self.rows) - 1}.get(step, index + step if isinstance(step, int) else index)
+        index = max(0, min(index, len(self.rows) - 1))
+        self.selected_row = self.rows[index]
+        self.see(index)
+        self.refresh()
+        return 'break'
+
+
 class ListView(tkinter.Toplevel):
     r'''
     List View Window
@@ -54,6 +277,12 @@ class ListView(tkinter.Toplevel):
         frame_treeview.rowconfigure(0, minsize=35)
         frame_treeview.rowconfigure(1, weight=1)
 
+        # Loading progress
+        self.progress_label = tkinter.Label(frame_treeview, text='')
+        self.progress_label.grid(column=0, row=0, sticky='nsw', padx=(5), pady=(5))
+        self.progress_bar = ttk.Progressbar(frame_treeview, mode='indeterminate', length=150)
+        self.progress_bar.grid(column=1, row=0, sticky='ew', padx=(5), pady=(5))
+
         # Filter
         tkinter.Label(frame_treeview, text='Filter ').grid(column=2, row=0, sticky='nesw', padx=(5), pady=(5))
         call_back_reg = (frame_treeview.register(self.__validate_text),'%P')        # register a callback function in Frame
@@ -61,21 +290,32 @@ class ListView(tkinter.Toplevel):
         self.filter_entry.grid(column=3, row=0, columnspan=2, sticky='nesw', padx=(5), pady=(5))
 
         # Treeview
-        heading_dict = {'file_name' : 'File Name', 'modified_date' :'Modified Date'}
-        column_size = (250, 250)
-        anchor = (tkinter.W, tkinter.CENTER)
-        self.treeview_list = ttk.Treeview(frame_treeview, columns=('file_name', 'modified_date'), show='headings')
-        for i, (key, value) in enumerate(heading_dict.items()):
-            self.treeview_list.heading(key, text=value)
+        self.heading_dict = {'file_name' : 'File Name', 'modified_date' :'Modified Date', 'size' : 'Size'}
+        column_size = (250, 200, 100)
+        anchor = (tkinter.W, tkinter.CENTER, tkinter.E)
+        self.treeview_list = ttk.Treeview(frame_treeview, columns=tuple(self.heading_dict.keys()), show='headings')
+        for i, (key, value) in enumerate(self.heading_dict.items()):
+            self.treeview_list.heading(key, text=value, command=lambda column=key: self.__sort_by(column))
             self.treeview_list.column(i, anchor=anchor[i], minwidth=30, width=column_size[i])
         self.treeview_list.grid(column=0, row=1, columnspan=4, sticky='nesw')
         self.treeview_list.columnconfigure(0, weight=1)
         self.treeview_list.rowconfigure(0, weight=1)
-        scroll_bar = ttk.Scrollbar(frame_treeview, orient=tkinter.VERTICAL, command=self.treeview_list.yview)
+        scroll_bar = ttk.Scrollbar(frame_treeview, orient=tkinter.VERTICAL)
         scroll_bar.grid(column=4, row=1, sticky='ns', padx=(0, 5))
-        self.treeview_list.configure(yscrollcommand=scroll_bar.set)
-        self.file_list = self.create_treeview_list()
-        self.tree_view_insert(self.file_list)
+        self.virtual_list = VirtualList(self.treeview_list, scroll_bar, formatter=self.__format_row)
+        self.filter_job = None
+        self.load_job = None
+        self.load_queue = Queue()
+        self.load_cancel = Event()
+        self.loading = False
+        self.refresh_pending = False
+        self.snapshot = {}
+        self.snapshot_signature = None
+        self.sort_column = None
+        self.sort_reverse = False
+        self.tree_view_insert([])
+        self.load_file_list()
+        self.master_win.subscribe_count(self.path_detail.name, self.__on_count_event)
         self.treeview_list.bind('<Double-1>', self.__tree_item_view)
         self.treeview_list.bind('<Return>', self.__tree_item_view)
 
@@ -89,9 +329,8 @@ class ListView(tkinter.Toplevel):
 
     def __tree_item_view(self, event=None):
         try:
-            item_id = self.treeview_list.selection()[0]
-            selected_item = self.treeview_list.item(item_id)['values']
-            startfile(join(self.path_detail.path, selected_item[0]))
+            selected_item = self.virtual_list.selected_row
+            startfile(join(self.path_detail.path, selected_item.name))
         except:
             messagebox.showerror('Selection error', 'No row is selected')
         logger.debug('Treeview double click, return')
@@ -101,30 +340,282 @@ class ListView(tkinter.Toplevel):
     def __validate_text(self, input: any):
         r'''
         Entry validation
-        Rebuild de treeview using the input as filter
+        Filter the list with the input once typing stops for FILTER_DELAY
         '''
-        logger.debug(input)
-        self.tree_view_insert(self.file_list, input)
+        if self.filter_job:
+            self.after_cancel(self.filter_job)
+        self.filter_job = self.after(FILTER_DELAY, self.__apply_filter, input)
         return True
-        
 
-    def tree_view_insert(self, name_date_list: list, filter: str | None=None):
-        self.treeview_list.delete(*self.treeview_list.get_children())
-        if filter:
-            name_date_list = [name_date for name_date in name_date_list if filter in name_date[0]]
-        for name_date in name_date_list:
-            self.treeview_list.insert('', tkinter.END, values=tuple(name_date))
+
+    def __apply_filter(self, filter: str) -> None:
+        r'''
+        Case insensitive filter over the case-folded name index
+        A query containing the previous one narrows the previous result instead of scanning every name
+        '''
+        self.filter_job = None
+        query = filter.casefold()
+        if query == self.filter_query:
+            return
+        logger.debug(query)
+        if not query:
+            self.filter_indexes = None
+        else:
+            name_index = self.name_index
+            if self.filter_query and self.filter_indexes is not None and self.filter_query in query:
+                self.filter_indexes = [index for index in self.filter_indexes if query in name_index[index]]
+            else:
+                self.filter_indexes = [index for index, name in enumerate(name_index) if query in name]
+        self.filter_query = query
+        self.virtual_list.set_rows(self.__display_rows())
+
+
+    def __sort_by(self, column: str) -> None:
+        r'''
+        Heading click, sort by column or reverse the current sort
+        '''
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        for key, value in self.heading_dict.items():
+            arrow = (' ▼' if self.sort_reverse else ' ▲') if key == self.sort_column else ''
+            self.treeview_list.heading(key, text=f'{value}{arrow}')
+        self.virtual_list.set_rows(self.__display_rows())
+
+
+    def __display_rows(self):
+        r'''
+        Rows to show for the current filter and sort
+        The ascending order of each column is kept in sort_orders until the list changes,
+        reversing or filtering a sorted list reuses it
+        '''
+        file_list = self.file_list
+        if self.sort_column is None:
+            return RowView(file_list, self.filter_indexes) if self.filter_query else file_list
+        sort_keys = self.sort_keys[self.sort_column]
+        order = self.sort_orders.get(self.sort_column)
+        if self.filter_query:
+            if order is None:
+                indexes = sorted(self.filter_indexes, key=sort_keys.__getitem__)
+            else:
+                selected = bytearray(len(file_list))
+                for index in self.filter_indexes:
+                    selected[index] = 1
+                indexes = [index for index in order if selected[index]]
+        else:
+            if order is None:
+                order = self.sort_orders[self.sort_column] = sorted(range(len(file_list)), key=sort_keys.__getitem__)
+            indexes = order
+        return RowView(file_list, indexes, self.sort_reverse)
+
+
+    def tree_view_insert(self, file_entries: list, filter: str | None=None):
+        r'''
+        Show the FileEntry list (filtered if informed), only the visible rows go to the Treeview
+        The case-folded name index used by the filter and the sort keys are built here
+        '''
+        self.file_list = file_entries
+        self.name_index = [file_entry.name.casefold() for file_entry in file_entries]
+        self.sort_keys = {'file_name' : self.name_index, 'modified_date' : [file_entry.mtime for file_entry in file_entries], 'size' : [file_entry.size for file_entry in file_entries]}
+        self.sort_orders = {}
+        self.sort_pending = False
+        self.filter_query = None
+        self.filter_indexes = None
+        self.__apply_filter(filter or '')
+
+
+    def __format_row(self, file_entry: file_handler.FileEntry) -> tuple:
+        r'''
+        Treeview values of a row, dates are only formatted for the rows shown
+        '''
+        return (file_entry.name, datetime.strftime(datetime.fromtimestamp(file_entry.mtime), '%d/%m/%Y %H:%M:%S'), f'{file_entry.size:,}')
+
+
+    def load_file_list(self) -> None:
+        r'''
+        List the path in a worker thread, rows are added in batches as they arrive
+        '''
+        self.progress_bar.grid()
+        self.progress_bar.start()
+        self.progress_label.configure(text='Loading')
+        self.__start_worker(self.__load_worker, self.path_detail)
+
+
+    def __start_worker(self, worker, *args) -> None:
+        self.loading = True
+        Thread(target=worker, args=args + (self.load_queue, self.load_cancel), daemon=True, name='List View Loader').start()
+        self.load_job = self.after(LOAD_PULL_INTERVAL, self.__pull_loader)
 
 
-    def create_treeview_list(self):
+    @staticmethod
+    def __load_worker(path_detail: PathDetails, load_queue: Queue, cancel: Event) -> None:
         try:
-            file_list = file_handler.file_list(self.path_detail.path, self.path_detail.extension)
-            if len(file_list) > 0:
-                name_date_list = [[file, datetime.strftime(datetime.fromtimestamp(getmtime(join(self.path_detail.path, file))), '%d/%m/%Y %H:%M:%S')] for file in file_list]
-                return name_date_list
+            signature = file_handler.directory_signature(path_detail.path)
+            listed = time()
+            for batch in file_handler.file_entry_batches(path_detail.path, path_detail.extension, batch_size=LOAD_BATCH_SIZE):
+                if cancel.is_set():
+                    logger.debug(f'{path_detail.name} list loading cancelled')
+                    return
+                load_queue.put(('batch', batch))
+            # A signature too close to the listing is not kept, the next refresh lists again
+            load_queue.put(('done', signature if settled(signature, listed) else None))
         except Exception as error:
-            logger.debug(error)
-            messagebox.showerror('File List Error', f'Could not load file list due {error}')            
+            load_queue.put(('error', error))
+
+
+    @staticmethod
+    def __snapshot_worker(path_detail: PathDetails, snapshot: dict, signature: tuple | None, load_queue: Queue, cancel: Event) -> None:
+        r'''
+        List the path again if its signature changed and diff it against the previous snapshot
+        Changed files (same name, other mtime or size) are removed and added again
+        '''
+        try:
+            new_signature = file_handler.directory_signature(path_detail.path)
+            if new_signature is not None and new_signature == signature:
+                load_queue.put(('unchanged', None))
+                return
+            listed = time()
+            new_snapshot = {file_entry.name : file_entry for batch in file_handler.file_entry_batches(path_detail.path, path_detail.extension, batch_size=LOAD_BATCH_SIZE) for file_entry in batch}
+            if cancel.is_set():
+                return
+            removed_names = {name for name, file_entry in snapshot.items() if new_snapshot.get(name) != file_entry}
+            added_entries = [file_entry for name, file_entry in new_snapshot.items() if snapshot.get(name) != file_entry]
+            if not settled(new_signature, listed):
+                new_signature = None
+            load_queue.put(('diff', (new_signature, new_snapshot, removed_names, added_entries)))
+        except Exception as error:
+            load_queue.put(('failed', error))
+
+
+    def __pull_loader(self) -> None:
+        r'''
+        Handle up to LOAD_PULL_BATCHES worker messages per call, the view is refreshed once
+        While listing, the rows of the call are appended to the current sort order unsorted,
+        the order is sorted once when the listing ends
+        '''
+        self.load_job = None
+        start = len(self.file_list)
+        for _ in range(LOAD_PULL_BATCHES):
+            try:
+                kind, value = self.load_queue.get_nowait()
+            except Empty:
+                break
+            if kind == 'batch':
+                self.__append_rows(value)
+                continue
+            self.loading = False
+            if kind == 'done':
+                self.snapshot_signature = value
+            elif kind == 'diff':
+                self.__apply_diff(*value)
+            elif kind == 'error':
+                logger.debug(value)
+                messagebox.showerror('File List Error', f'Could not load file list due {value}')
+            elif kind == 'failed':
+                logger.warning(f'Could not refresh {self.path_detail.name} list view {value}')
+            break
+        added = len(self.file_list) > start
+        if added:
+            self.__merge_sort_order(range(start, len(self.file_list)), deferred=True)
+        sorted_now = self.sort_pending and not self.loading
+        if sorted_now:
+            self.__merge_sort_order(())
+        if self.sort_column is not None and (added or sorted_now):
+            self.virtual_list.update_rows(self.__display_rows(), self.virtual_list.first_row())
+        elif added:
+            self.virtual_list.refresh()
+        if self.loading:
+            self.progress_label.configure(text=f'Loading {len(self.file_list)} files')
+            self.load_job = self.after(LOAD_PULL_INTERVAL, self.__pull_loader)
+            return
+        self.progress_bar.stop()
+        self.progress_bar.grid_remove()
+        self.progress_label.configure(text=f'{len(self.file_list)} files')
+        if self.refresh_pending:
+            self.refresh_pending = False
+            self.__start_worker(self.__snapshot_worker, self.path_detail, self.snapshot, self.snapshot_signature)
+
+
+    def __on_count_event(self, count_event: CountEvent) -> None:
+        r'''
+        Path count published, compare a new snapshot with the current one
+        While a listing is running the refresh waits for it to finish
+        '''
+        if self.loading:
+            self.refresh_pending = True
+            return
+        self.__start_worker(self.__snapshot_worker, self.path_detail, self.snapshot, self.snapshot_signature)
+
+
+    def __append_rows(self, file_entries: list) -> None:
+        r'''
+        Add rows to the list, name index, sort keys and snapshot
+        Matching rows are added to the current filter result, the sort order is merged by the caller
+        '''
+        start = len(self.file_list)
+        self.file_list.extend(file_entries)
+        self.name_index.extend(file_entry.name.casefold() for file_entry in file_entries)
+        self.sort_keys['modified_date'].extend(file_entry.mtime for file_entry in file_entries)
+        self.sort_keys['size'].extend(file_entry.size for file_entry in file_entries)
+        self.snapshot.update((file_entry.name, file_entry) for file_entry in file_entries)
+        if self.filter_query:
+            query = self.filter_query
+            name_index = self.name_index
+            self.filter_indexes.extend(index for index in range(start, len(name_index)) if query in name_index[index])
+
+
+    def __merge_sort_order(self, new_indexes, kept_positions: list | None=None, deferred: bool=False) -> None:
+        r'''
+        Keep only the order of the current sort column, remapped by kept_positions
+        (new index + 1 of each old index, 0 if removed) and with new_indexes merged
+        The order is nearly sorted, sorting it again costs close to a single pass
+        With deferred the new indexes are only appended, sort_pending until the next merge
+        '''
+        order = self.sort_orders.get(self.sort_column)
+        self.sort_orders = {}
+        if order is None:
+            self.sort_pending = False
+            return
+        if kept_positions is not None:
+            order = [kept_positions[index] - 1 for index in order if kept_positions[index]]
+        order.extend(new_indexes)
+        self.sort_pending = deferred
+        if not deferred:
+            order.sort(key=self.sort_keys[self.sort_column].__getitem__)
+        self.sort_orders[self.sort_column] = order
+
+
+    def __apply_diff(self, signature: tuple | None, snapshot: dict, removed_names: set, added_entries: list) -> None:
+        r'''
+        Remove and insert only the rows in the diff, keeping the selected row and the first row shown
+        '''
+        self.snapshot_signature = signature
+        self.snapshot = snapshot
+        if not removed_names and not added_entries:
+            return
+        logger.debug(f'{self.path_detail.name} list view {len(added_entries)} added, {len(removed_names)} removed')
+        anchor_row = self.virtual_list.first_row()
+        selected_row = self.virtual_list.selected_row
+        if selected_row is not None and selected_row.name in removed_names and selected_row.name in snapshot:
+            self.virtual_list.selected_row = snapshot[selected_row.name]
+        kept_positions = None
+        if removed_names:
+            keep = [file_entry.name not in removed_names for file_entry in self.file_list]
+            kept_positions = [position if kept else 0 for position, kept in zip(accumulate(keep), keep)]
+            for parallel_list in (self.file_list, self.name_index, self.sort_keys['modified_date'], self.sort_keys['size']):
+                parallel_list[:] = compress(parallel_list, keep)
+        start = len(self.file_list)
+        self.file_list.extend(added_entries)
+        self.name_index.extend(file_entry.name.casefold() for file_entry in added_entries)
+        self.sort_keys['modified_date'].extend(file_entry.mtime for file_entry in added_entries)
+        self.sort_keys['size'].extend(file_entry.size for file_entry in added_entries)
+        if self.filter_query:
+            query = self.filter_query
+            self.filter_indexes = [index for index, name in enumerate(self.name_index) if query in name]
+        self.__merge_sort_order(range(start, len(self.file_list)), kept_positions)
+        self.virtual_list.update_rows(self.__display_rows(), anchor_row)
 
 
     def __on_window_close(self):
@@ -134,6 +625,11 @@ class ListView(tkinter.Toplevel):
 
     # destroy override
     def destroy(self) -> None:
+        self.load_cancel.set()
+        self.master_win.unsubscribe_count(self.path_detail.name, self.__on_count_event)
+        for job in (self.filter_job, self.load_job):
+            if job:
+                self.after_cancel(job)
         if self.last_grab:
             self.last_grab.grab_set()
         self.master_win.attributes('-topmost', self.config_values.always_on_top)
@@ -199,6 +695,15 @@ class Config_Window(tkinter.Toplevel):
         self.time_entry = tkinter.Entry(config_main, justify='center')
         self.time_entry.grid(column=3, row=0, sticky='nesw', columnspan=2, padx=(5), pady=(5))
         self.time_entry.insert(tkinter.END, self.config_values.update_time)
+        # Oldest file age in minutes to highlight a path row, 0 disables
+        tkinter.Label(config_main, text='Age warning (min)', justify='left').grid(column=2, row=1, sticky='nesw', padx=(5), pady=(5))
+        self.age_warning_entry = tkinter.Entry(config_main, justify='center')
+        self.age_warning_entry.grid(column=3, row=1, sticky='nesw', columnspan=2, padx=(5), pady=(5))
+        self.age_warning_entry.insert(tkinter.END, self.config_values.age_warning)
+        tkinter.Label(config_main, text='Age critical (min)', justify='left').grid(column=2, row=2, sticky='nesw', padx=(5), pady=(5))
+        self.age_critical_entry = tkinter.Entry(config_main, justify='center')
+        self.age_critical_entry.grid(column=3, row=2, sticky='nesw', columnspan=2, padx=(5), pady=(5))
+        self.age_critical_entry.insert(tkinter.END, self.config_values.age_critical)
 
         # Treeview Frame
         config_treeview = tkinter.Frame(self)
@@ -207,14 +712,17 @@ class Config_Window(tkinter.Toplevel):
         config_treeview.rowconfigure(0, weight=1)
 
         # Treeview
-        headings_dict = {'name' : 'Display name', 'path' : 'Path', 'extension' : 'Extension','ignore' : 'Ignore'}
-        column_size = (100, 150, 70, 100)
-        self.path_treeview = ttk.Treeview(config_treeview, columns=('name', 'path', 'extension', 'ignore'), show='headings')
+        headings_dict = {'name' : 'Display name', 'path' : 'Path', 'extension' : 'Extension','ignore' : 'Ignore', 'monitor_mode' : 'Mode', 'recursive' : 'Recursive'}
+        column_size = (100, 150, 70, 100, 60, 70)
+        self.path_treeview = ttk.Treeview(config_treeview, columns=tuple(headings_dict.keys()), show='headings')
         for i, (key, value) in enumerate(headings_dict.items()):
             self.path_treeview.heading(key, text=value)
             self.path_treeview.column(i, minwidth=20, width=column_size[i])
+        # Keep the original objects so fields not shown in the treeview survive the edit
+        self.path_details = {}
         for path_value in self.config_values.path_list:
-            self.path_treeview.insert('', tkinter.END, values=(path_value.name, path_value.path, path_value.extension, path_value.ignore))
+            item_id = self.path_treeview.insert('', tkinter.END, values=(path_value.name, path_value.path, path_value.extension, path_value.ignore, path_value.monitor_mode, str(path_value.recursive)))
+            self.path_details[item_id] = path_value
         self.path_treeview.grid(column=0, row=0, columnspan=4, sticky='nesw')
         scroll_bar = ttk.Scrollbar(config_treeview, orient=tkinter.VERTICAL, command=self.path_treeview.yview)
         scroll_bar.grid(column=4, row=0, sticky='ns', padx=(0, 5))
@@ -261,9 +769,9 @@ class Config_Window(tkinter.Toplevel):
         try:
             # Code here
             self.path_treeview.selection()[0]
-            label_list = ('Display name', 'Path', 'Extension', 'Ignore')
-            type_list = ('str', 'path', 'str', 'str')
-            self.path_treeview_edit = Edit_Values(self.path_treeview, self.config_values, label_list, type_list, 'Edit directory values')
+            label_list = ('Display name', 'Path', 'Extension', 'Ignore', 'Mode', 'Recursive')
+            type_list = ('str', 'path', 'str', 'str', 'combo_box', 'boolean')
+            self.path_treeview_edit = Edit_Values(self.path_treeview, self.config_values, label_list, type_list, 'Edit directory values', drop_down_list={'Mode' : MONITOR_MODES})
         except Exception as error:
             logger.debug(error)
             messagebox.showerror('Edit error', 'No row is selected')
@@ -288,7 +796,8 @@ class Config_Window(tkinter.Toplevel):
         Add row to treeview
         '''
         logger.debug('Treeview add')
-        empty_values = ['' for _ in range(4)]
+        # Left blank so Cancel on the edit window removes it, the editor shows the defaults
+        empty_values = ['' for _ in range(6)]
         self.path_treeview.insert('', tkinter.END, values=(tuple(empty_values)))
         children_list = self.path_treeview.get_children()
         self.path_treeview.selection_set(children_list[-1])
@@ -319,15 +828,45 @@ class Config_Window(tkinter.Toplevel):
 
         new_config = deepcopy(self.config_values)
         new_config.update_time = int(self.time_entry.get())
-        new_config.path_list = [PathDetails(*self.path_treeview.item(value)['values']) for value in self.path_treeview.get_children()]
+        new_config.age_warning = int(self.age_warning_entry.get() or 0)
+        new_config.age_critical = int(self.age_critical_entry.get() or 0)
+        try:
+            new_config.path_list = [self.__path_details_from_item(item_id) for item_id in self.path_treeview.get_children()]
+        except re.error as error:
+            messagebox.showerror('Save error', f'Invalid ignore pattern {error.pattern} ({error})')
+            self.lift()
+            return
+        if any(not path_value.name or not path_value.path for path_value in new_config.path_list):
+            messagebox.showerror('Save error', 'Every path needs a display name and a path')
+            self.lift()
+            return
+        invalid_modes = [path_value.name for path_value in new_config.path_list if not path_value.monitor_mode in MONITOR_MODES]
+        if invalid_modes:
+            messagebox.showerror('Save error', f'Invalid mode for {", ".join(invalid_modes)}, use one of {", ".join(MONITOR_MODES)}')
+            self.lift()
+            return
         if not self.config_values.__eq__(new_config):
             logger.debug('Configuration objects are different')
             self.config_values = deepcopy(new_config)
             json_config.save_json_config(self.config_path, new_config.to_dict())
-            logger.info('<UPDATE> Configuration values updated')
+            logger.info('Configuration values updated')
+            self.master_win.event_generate('<<ConfigUpdated>>', when='tail')
         self.destroy()
 
 
+    def __path_details_from_item(self, item_id: str) -> PathDetails:
+        r'''
+        Build PathDetails from treeview row, keeping hidden fields of the original
+        '''
+        name, path, extension, ignore, monitor_mode, recursive = [str(value) for value in self.path_treeview.item(item_id)['values']]
+        # Edit_Values writes the boolean back as 1 / 0
+        recursive = recursive in ('True', '1')
+        original = self.path_details.get(item_id)
+        if original is None:
+            return PathDetails(name, path, extension, ignore, monitor_mode, recursive=recursive)
+        return replace(original, name=name, path=path, extension=extension, ignore=ignore, monitor_mode=monitor_mode, recursive=recursive)
+
+
     def __on_window_close(self):
         logger.debug('On close click')
         self.destroy()
@@ -400,9 +939,10 @@ class Edit_Values(tkinter.Toplevel):
                         radio_bool_button[i] = tkinter.ttk.Radiobutton(self, text=boolean_name[i], value=eval(boolean_name[i]), variable=entry, command=lambda variable=entry: self.__click_radio_bool(variable))
                         radio_bool_button[i].grid(column=1 + i, row=key_index)
                 case 'combo_box':
-                    entry = ttk.Combobox(self, width=50, justify='center')
+                    # Only the listed values can be chosen
+                    entry = ttk.Combobox(self, width=50, justify='center', state='readonly')
                     entry['values'] = drop_down_list[key_list[key_index]]
-                    entry.set(str(self.record_value[key_index]) if not str(self.record_value[key_index]) == '' else 'Daily')
+                    entry.set(str(self.record_value[key_index]) if not str(self.record_value[key_index]) == '' else drop_down_list[key_list[key_index]][0])
                     entry.grid(column=1, row=key_index, sticky='nesw', columnspan=3, padx=(5), pady=(5, 0))
                 case _:
                     entry = ttk.Entry(self, width=50, justify='center')
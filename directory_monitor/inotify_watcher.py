@@ -0,0 +1,227 @@
+import ctypes, ctypes.util, logging, os, select, struct, sys, support_funcions
+from classes import PathDetails
+
+logger = logging.getLogger('inotify_watcher')
+
+
+# Constants from <sys/inotify.h>
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o00004000
+IN_CLOEXEC = 0o02000000
+
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+ADDED_MASK = IN_CREATE | IN_MOVED_TO
+REMOVED_MASK = IN_DELETE | IN_MOVED_FROM
+LOST_MASK = IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+# struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError) as error:
+        logger.debug(f'Inotify not available {error}')
+        return None
+
+
+_libc = _load_libc()
+
+
+def inotify_available() -> bool:
+    return _libc is not None
+
+
+class DirectoryWatcher:
+    r'''
+    Directory Watcher
+    -----------------
+
+    Keep file counts updated from inotify create, delete and move events.
+    The matching names of each path are kept, a file renamed over an existing name
+    (no delete event for the replaced file) or any repeated event leaves the count right.
+    Paths that can not be watched, or that lose their watch, are handed back
+    to be polled. A kernel queue overflow rescans every watched path.
+    Paths on the same directory (other extension or ignore) share the watch descriptor
+    the kernel returns for it, watches is {wd : [PathDetails]}.
+    '''
+    def __init__(self) -> None:
+        if _libc is None:
+            raise OSError('Inotify is not available on this system')
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number))
+        self.watches = {}
+        self.counts = {}
+        self.names = {}
+        self.lost = []
+
+
+    def watch(self, path_list: list) -> list:
+        r'''
+        Add watches for the paths in watch mode
+        Return the paths that must be polled, recursive ones included
+        '''
+        poll_list = []
+        for path_value in path_list:
+            if path_value.monitor_mode == 'poll' or path_value.recursive or not self.add_path(path_value):
+                poll_list.append(path_value)
+        return poll_list
+
+
+    def add_path(self, path_value: PathDetails) -> bool:
+        r'''
+        Add the watch first and count after it, so no event is missed
+        '''
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path_value.path), WATCH_MASK)
+        if wd < 0:
+            error_number = ctypes.get_errno()
+            logger.warning(f'Could not watch {path_value.path} ({os.strerror(error_number)}), polling instead')
+            return False
+        self.watches.setdefault(wd, []).append(path_value)
+        try:
+            self.__list_names(path_value)
+        except Exception as error:
+            logger.error(f'Could not count {path_value.path} {error}')
+            self.__remove_from_watch(wd, path_value.name)
+            return False
+        logger.debug(f'Watching {path_value.path}')
+        return True
+
+
+    def rescan(self) -> dict:
+        r'''
+        Count again every watched path
+        '''
+        for wd, path_list in list(self.watches.items()):
+            try:
+                for path_value in path_list:
+                    self.__list_names(path_value)
+            except Exception as error:
+                logger.error(f'Rescan error {path_value.path} {error}')
+                self.__lose_watch(wd)
+        return dict(self.counts)
+
+
+    def read_events(self, timeout: float) -> dict:
+        r'''
+        Wait up to timeout seconds for events
+        Return {path name : count} for the paths changed
+        '''
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return {}
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return {}
+        changed = {}
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning('Inotify queue overflow, rescanning all watched paths')
+                return self.rescan()
+            path_list = self.watches.get(wd)
+            if not path_list:
+                continue
+            if mask & LOST_MASK:
+                logger.warning(f'Watch lost for {path_list[0].path}, polling instead')
+                self.__lose_watch(wd)
+                continue
+            for path_value in path_list:
+                if not support_funcions.file_matches(path_value, name):
+                    continue
+                names = self.names[path_value.name]
+                if mask & ADDED_MASK:
+                    names.add(name)
+                else:
+                    names.discard(name)
+                self.counts[path_value.name] = changed[path_value.name] = len(names)
+        return {name : count for name, count in changed.items() if name in self.counts}
+
+
+    def resync(self, path_value: PathDetails, count: int) -> int:
+        r'''
+        Compare the watched count with the count of a scan, listing the names again if different
+        Events still queued are applied again without effect, adding or removing a name is idempotent
+        Return the watched count
+        '''
+        if self.counts.get(path_value.name, count) != count:
+            logger.warning(f'{path_value.name} watched count {self.counts[path_value.name]} differs from scan {count}, listing again')
+            self.__list_names(path_value)
+        return self.counts.get(path_value.name, count)
+
+
+    def __list_names(self, path_value: PathDetails) -> None:
+        names = set(support_funcions.file_names(path_value))
+        self.names[path_value.name] = names
+        self.counts[path_value.name] = len(names)
+
+
+    def remove_path(self, path_name: str) -> None:
+        for wd, path_list in list(self.watches.items()):
+            if any(path_value.name == path_name for path_value in path_list):
+                self.__remove_from_watch(wd, path_name)
+
+
+    def pop_lost(self) -> list:
+        r'''
+        Paths that lost their watch since last call
+        '''
+        lost, self.lost = self.lost, []
+        return lost
+
+
+    def __lose_watch(self, wd: int) -> None:
+        path_list = self.watches.get(wd, [])
+        self.__remove_watch(wd)
+        self.lost += path_list
+
+
+    def __remove_from_watch(self, wd: int, path_name: str) -> None:
+        r'''
+        Stop following one path, the watch itself is removed with its last path
+        '''
+        path_list = self.watches.get(wd, [])
+        for path_value in [path_value for path_value in path_list if path_value.name == path_name]:
+            path_list.remove(path_value)
+            self.counts.pop(path_name, None)
+            self.names.pop(path_name, None)
+        if not path_list:
+            self.__remove_watch(wd)
+
+
+    def __remove_watch(self, wd: int) -> None:
+        path_list = self.watches.pop(wd, None)
+        if path_list is not None:
+            for path_value in path_list:
+                self.counts.pop(path_value.name, None)
+                self.names.pop(path_value.name, None)
+            _libc.inotify_rm_watch(self.fd, wd)
+
+
+    def close(self) -> None:
+        for wd in list(self.watches.keys()):
+            self.__remove_watch(wd)
+        os.close(self.fd)
@@ -1,11 +1,12 @@
-import logging, json_config, tkinter, file_handler
+import atexit, logging, json_config, file_handler
+from collections import deque
+from threading import Lock
 from datetime import datetime
 from os.path import abspath, splitext
 from dataclasses import dataclass
-from tkinter.scrolledtext import ScrolledText
-from queue import Queue
+from queue import Queue, Full, Empty
 from logging.config import dictConfig
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 from os.path import dirname
 
 
@@ -22,10 +23,21 @@ class LogConfig:
     log_extension : str
 
 
-try:
-    template = """{
+LOG_CONFIG_FILE = 'logger_config.json'
+# What to do with a record when the asynchronous logging queue is full
+OVERFLOW_POLICIES = ('drop_new', 'drop_old', 'block')
+# Messages kept for the GUI by LogQueuer, the oldest are dropped beyond it
+LOG_RING_CAPACITY = 1000
+
+
+template = """{
     "version": 1,
     "disable_existing_loggers": false,
+    "async_logging": {
+        "enabled": false,
+        "queue_size": 10000,
+        "overflow": "drop_new"
+    },
     "formatters": {
         "brief": {
             "format" : "[%(asctime)s - %(levelname)s] %(name)-12s %(message)s",
@@ -54,7 +66,8 @@ try:
         "queue_handler" : {
             "class" : "log_builder.LogQueuer",
             "formatter" : "brief",
-            "level" : "DEBUG"
+            "level" : "DEBUG",
+            "capacity" : 1000
         }
     },
     "root": {
@@ -65,33 +78,104 @@ try:
     }
 }"""
 
-    config = json_config.load_json_config('logger_config.json', template)
+
+def load_config() -> dict:
+    r'''
+    Load the logger configuration, created from template if missing
+    Done on setup, not on import, so importing this module has no side effects
+    '''
+    config = json_config.load_json_config(LOG_CONFIG_FILE, template)
     for handler in config['handlers'].values():
         if 'filename' in handler.keys():
             file_handler.check_create_dir(dirname(handler['filename']))
-except Exception as error:
-    print(f'Config loading error {error}')
-    exit()
+    return config
 
 
-def logger_setup(logger: logging.Logger | None, log_queue: Queue | None=None):
+def logger_setup(logger: logging.Logger | None, log_queue: 'LogRing | None'=None, async_logging: bool | None=None):
+    r'''
+    Configure the handlers from logger_config.json
+    With async_logging (or "async_logging" enabled in the file, when not informed) the handlers
+    of logger run on a listener thread, see start_async
+    '''
     try:
+        config = load_config()
+        # Not a dictConfig key, only read here
+        async_config = config.pop('async_logging', {})
         dictConfig(config)
         if not log_queue == None:
             # logger = add_log_queuer(logger, log_queue)
             logger = add_handler(logger, LogQueuer, log_queue)
+        if async_config.get('enabled', False) if async_logging is None else async_logging:
+            start_async(logger, int(async_config.get('queue_size', 10000)), async_config.get('overflow', 'drop_new'))
     except Exception as error:
         print(error)
         exit()
 
 
-def add_handler(current_logger=logging.Logger, handler_class=logging.Handler, log_queue=None | Queue):
+def start_async(current_logger: logging.Logger, queue_size: int=10000, overflow: str='drop_new') -> 'AsyncQueueHandler':
+    r'''
+    Move the handlers of the logger behind a bounded queue served by a listener thread
+    Logging calls only format the message and queue the record, disk writes and file rotation
+    happen on the listener. Records left in the queue are handled by stop_async, also called at exit
+    '''
+    if not overflow in OVERFLOW_POLICIES:
+        raise ValueError(f'Invalid overflow policy {overflow}, use one of {OVERFLOW_POLICIES}')
+    handlers = list(current_logger.handlers)
+    for handler in handlers:
+        current_logger.removeHandler(handler)
+    record_queue = Queue(queue_size)
+    listener = AsyncQueueListener(record_queue, *handlers, respect_handler_level=True)
+    queue_handler = AsyncQueueHandler(record_queue, listener, overflow)
+    current_logger.addHandler(queue_handler)
+    listener.start()
+    atexit.register(stop_async, current_logger)
+    return queue_handler
+
+
+def stop_async(current_logger: logging.Logger) -> None:
+    r'''
+    Handle the queued records and give the handlers back to the logger, logging is synchronous again
+    Does nothing if the logger is not asynchronous
+    '''
+    for queue_handler in [handler for handler in current_logger.handlers if isinstance(handler, AsyncQueueHandler)]:
+        queue_handler.listener.stop()
+        current_logger.removeHandler(queue_handler)
+        for handler in queue_handler.listener.handlers:
+            current_logger.addHandler(handler)
+        if queue_handler.dropped:
+            current_logger.warning(f'{queue_handler.dropped} log messages dropped by the full logging queue')
+
+
+def all_handlers(current_logger: logging.Logger) -> list:
+    r'''
+    Handlers of the logger, including the ones behind an asynchronous queue
+    '''
+    handlers = []
+    for handler in current_logger.handlers:
+        if isinstance(handler, AsyncQueueHandler):
+            handlers += handler.listener.handlers
+        else:
+            handlers.append(handler)
+    return handlers
+
+
+def async_dropped(current_logger: logging.Logger) -> int:
+    r'''
+    Records discarded by the full asynchronous logging queue
+    '''
+    return sum(handler.dropped for handler in current_logger.handlers if isinstance(handler, AsyncQueueHandler))
+
+
+def add_handler(current_logger=logging.Logger, handler_class=logging.Handler, log_queue=None):
     formatter =''
     level = ''
     for handler in current_logger.handlers:
         if isinstance(handler, handler_class):
             formatter = handler.formatter
             level = handler.level
+            if isinstance(handler, LogQueuer) and log_queue is not None:
+                # Capacity set in logger_config.json
+                log_queue.resize(handler.log_queue.capacity)
             current_logger.handlers.remove(handler)
     if not formatter and not level:
         formatter = current_logger.handlers[0].formatter
@@ -106,7 +190,23 @@ def add_handler(current_logger=logging.Logger, handler_class=logging.Handler, lo
     return current_logger
 
 
-def add_log_queuer(current_logger=logging.Logger, log_queue=Queue()):
+def redirect_stream_handlers(current_logger: logging.Logger, old_stream, new_stream) -> None:
+    r'''
+    Point stream handlers writing to old_stream to new_stream
+    '''
+    for handler in all_handlers(current_logger):
+        if isinstance(handler, logging.StreamHandler) and handler.stream is old_stream:
+            handler.setStream(new_stream)
+
+
+def dropped_messages(current_logger: logging.Logger) -> int:
+    r'''
+    Messages discarded by the LogQueuer handlers of the logger, each LogRing counted once
+    '''
+    return sum(log_ring.dropped for log_ring in {handler.log_queue for handler in all_handlers(current_logger) if isinstance(handler, LogQueuer)})
+
+
+def add_log_queuer(current_logger=logging.Logger, log_queue=None):
     formatter =''
     level = ''
     for handler in current_logger.handlers:
@@ -125,7 +225,7 @@ def add_log_queuer(current_logger=logging.Logger, log_queue=Queue()):
     
 
 class TextHandler(logging.Handler):
-    def __init__(self, text=ScrolledText, log_format=str, log_level=int):
+    def __init__(self, text=None, log_format=str, log_level=int):
         logging.Handler.__init__(self)
         formatter = logging.Formatter(log_format, datefmt='%Y/%m/%d %H:%M:%S')
         logging.Handler.setFormatter(self, formatter)
@@ -140,21 +240,153 @@ class TextHandler(logging.Handler):
             line_count = int(float(self.text.index('end')))
             if line_count > 300:
                 self.text.delete('1.0', str("{:0.1f}".format(line_count - 299)))
-            self.text.insert(tkinter.END, f'{message}\n')
+            self.text.insert('end', f'{message}\n')
             self.text.configure(state='disabled')
-            self.text.yview(tkinter.END)        
+            self.text.yview('end')        
         self.text.after(0, append)    
 
+class LogRing:
+    r'''
+    Log Ring
+    --------
+
+    Last capacity log messages in a deque, read by the GUI with drain.
+    When full, the oldest message is dropped and counted by level. The next drain starts
+    with a summary line of what was dropped since the previous one, so nothing vanishes
+    silently, last_drops keeps {level : count} of that summary for the consumer.
+    put and drain share one short lock, the dropped message is read, counted and replaced
+    without a consumer taking it in between.
+    '''
+    def __init__(self, capacity: int=LOG_RING_CAPACITY) -> None:
+        self.capacity = capacity
+        self.records = deque(maxlen=capacity)
+        self.dropped_levels = {}
+        self.pending_drops = {}
+        self.last_drops = {}
+        self.lock = Lock()
+
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+    @property
+    def dropped(self) -> int:
+        with self.lock:
+            return sum(self.dropped_levels.values())
+
+
+    def put(self, level_name: str, message: str) -> None:
+        with self.lock:
+            if len(self.records) == self.capacity:
+                dropped_level = self.records[0][0]
+                self.dropped_levels[dropped_level] = self.dropped_levels.get(dropped_level, 0) + 1
+                self.pending_drops[dropped_level] = self.pending_drops.get(dropped_level, 0) + 1
+            self.records.append((level_name, message))
+
+
+    def drain(self) -> list:
+        r'''
+        Take every message in one batch, oldest first
+        '''
+        with self.lock:
+            records = list(self.records)
+            self.records.clear()
+            pending_drops, self.pending_drops = self.pending_drops, {}
+            self.last_drops = pending_drops
+        messages = [message for _, message in records]
+        if pending_drops:
+            level_text = ', '.join(f'{level} {count}' for level, count in sorted(pending_drops.items(), key=lambda item : -item[1]))
+            messages.insert(0, f'{sum(pending_drops.values())} messages dropped ({level_text})')
+        return messages
+
+
+    def resize(self, capacity: int) -> None:
+        r'''
+        Change the capacity keeping the newest messages
+        '''
+        with self.lock:
+            self.capacity = capacity
+            self.records = deque(self.records, maxlen=capacity)
+
+
 class LogQueuer(logging.Handler):
-    def __init__(self, log_queue=Queue()) -> None:
+    def __init__(self, log_queue: LogRing | None=None, capacity: int=LOG_RING_CAPACITY) -> None:
         logging.Handler.__init__(self)
-        self.log_queue = log_queue
+        self.log_queue = LogRing(capacity) if log_queue is None else log_queue
+
+
+    @property
+    def dropped(self) -> int:
+        return self.log_queue.dropped
 
     
     def emit(self, record):
-        if self.log_queue.qsize() >= 100:
-            self.log_queue.get(block=False)
-        self.log_queue.put(self.format(record))
+        self.log_queue.put(record.levelname, self.format(record))
+
+
+class AsyncQueueHandler(QueueHandler):
+    r'''
+    Queue handler of start_async, applying the overflow policy when the queue is full
+    drop_new discards the record being logged, drop_old the oldest queued one,
+    block waits for the listener (a slow disk stalls the caller again)
+    The listener stop sentinel is never dropped, once stopping drop_old behaves as drop_new
+    '''
+    def __init__(self, record_queue: Queue, listener: 'AsyncQueueListener', overflow: str='drop_new') -> None:
+        super().__init__(record_queue)
+        self.listener = listener
+        self.overflow = overflow
+        self.dropped = 0
+
+
+    def enqueue(self, record):
+        if self.overflow == 'block':
+            self.queue.put(record)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except Full:
+                if self.overflow == 'drop_new' or self.listener.stopping:
+                    self.dropped += 1
+                    return
+            try:
+                oldest = self.queue.get_nowait()
+            except Empty:
+                continue
+            if oldest is self.listener._sentinel:
+                # Put back for the listener to stop, waits for the room just freed
+                self.queue.put(oldest)
+                self.dropped += 1
+                return
+            self.dropped += 1
+
+
+class AsyncQueueListener(QueueListener):
+    r'''
+    Queue listener of start_async, stop can be called more than once
+    The stop sentinel waits for room instead of failing on a full queue,
+    stopping tells the handlers not to drop queued records for it
+    '''
+    def __init__(self, record_queue: Queue, *handlers, respect_handler_level: bool=False) -> None:
+        super().__init__(record_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.stopping = False
+
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+    def start(self):
+        self.stopping = False
+        super().start()
+
+
+    def stop(self):
+        if self._thread is not None:
+            self.stopping = True
+            super().stop()
 
 
 class TimeStampedFileHandler(logging.FileHandler):
@@ -0,0 +1,407 @@
+import logging, tkinter, file_handler, support_funcions
+from classes import ConfigurationValues, CountEvent
+from count_history import HistoryRegistry
+from result_channel import ResultChannel, merge_count_events
+from log_builder import LogRing
+from monitor import DirectoryMonitor
+from gui_builder import Config_Window, About, ListView
+from tkinter import messagebox
+from tkinter import filedialog
+from tkinter import ttk
+from PIL import Image, ImageTk
+from time import perf_counter, time
+from datetime import datetime
+
+logger = logging.getLogger('main_window')
+
+
+# GUI queue polling, interval in milliseconds and time budget per tick in seconds
+PULL_INTERVAL = 100
+PULL_TIME_BUDGET = 0.05
+PULL_BATCH_SIZE = 500
+# Samples shown in the trend column
+TREND_WIDTH = 20
+# File ages and row highlight refresh, interval in milliseconds
+AGE_REFRESH_INTERVAL = 5000
+
+
+class MainApp(tkinter.Tk):
+    def __init__(self, title: str, log_queue: LogRing, result_channel: ResultChannel, monitor : DirectoryMonitor, config: ConfigurationValues, *args, **kwargs) -> None:
+        tkinter.Tk.__init__(self, *args, **kwargs)
+        self.title(title)
+        self.config_values = config
+        self.log_queue = log_queue
+        self.result_channel = result_channel
+        self.monitor = monitor
+        self.count_subscribers = {}
+        self.history = HistoryRegistry()
+        # {path name : (total size, oldest mtime, newest mtime)} of the last scan
+        self.path_stats = {}
+        # {path name : (files in per minute, files out per minute)}
+        self.path_rates = {}
+        # {path name : (files added, files removed)} while the monitor was stopped
+        self.offline_changes = {}
+
+        # If config has window size and position, set it in app
+        win_pos = support_funcions.check_win_pos(self.config_values, 'main')
+        if win_pos:
+            self.geometry(win_pos)
+
+        # Icon load hard coded, but it doesn't matter
+        try:
+            self.icon_path = file_handler.resource_path('./Icon/walrus.png')
+            icon = Image.open(self.icon_path)
+            icon.resize((96, 96), Image.Resampling.LANCZOS)
+            photo = ImageTk.PhotoImage(icon)
+            self.wm_iconphoto(True, photo)
+        except Exception as error:
+            logger.error(f'Could not load icon {error}')
+        
+        # Configure grid columns weight (follow resize)
+        self.grid_columnconfigure(0, weight=1, minsize=200)
+        self.grid_columnconfigure(2, weight=1, minsize=100)
+        self.grid_rowconfigure(0, weight=1)
+
+        # Menu bar creation
+        menu_bar = tkinter.Menu(self)
+        file_menu = tkinter.Menu(menu_bar, tearoff=0)
+        help_menu = tkinter.Menu(menu_bar, tearoff=0)
+        edit_menu = tkinter.Menu(menu_bar, tearoff=0)
+        file_menu.add_command(label='Update    ', command=self.__update)
+        file_menu.add_command(label='Export history', command=self.__export_history)
+        file_menu.add_command(label='Exit     ', command=self.__quit_window)
+        edit_menu.add_command(label='Settings', command=self.__configuration)
+        help_menu.add_command(label='About     ', command=self.__about_command)
+        menu_bar.add_cascade(label='File     ', menu=file_menu)
+        menu_bar.add_cascade(label='Edit     ', menu=edit_menu)
+        menu_bar.add_cascade(label='Help     ', menu=help_menu)
+        self.config(menu=menu_bar)
+
+        # treeview
+        column_list = ('path_name', 'quantity', 'flow', 'size', 'oldest', 'newest', 'trend')
+        width_list = (150, 80, 110, 80, 80, 80, 160)
+        self.column_descr = ('Path Name' , 'Quantity', 'In / Out per min', 'Size', 'Oldest', 'Newest', 'Trend')
+        # Tree column only opens the sub directory rows of recursive paths
+        self.path_tree_view = ttk.Treeview(self, columns=column_list, show='tree headings')
+        self.path_tree_view.column('#0', width=30, minwidth=30, stretch=False)
+        self.path_tree_view.column('# 2', anchor=tkinter.CENTER)
+
+        # treeview style
+        self.style = ttk.Style()
+        self.style.configure('Treeview.Heading', rowheight=30, font=(None, 10, 'bold'))
+        self.style.configure('Treeview', rowheight=30, font=(None, 12))
+        # Rows with the oldest file above the configured ages
+        self.path_tree_view.tag_configure('warning', background='#fff2a8')
+        self.path_tree_view.tag_configure('critical', background='#f5b7b1')
+
+        for i in range(len(column_list)):
+            self.path_tree_view.heading(column_list[i], text=self.column_descr[i])
+            self.path_tree_view.column(column_list[i], minwidth=20, width=width_list[i])
+        self.path_tree_view.grid(column=0, row=0, columnspan=3, sticky='nesw', padx=(5, 0), pady=(5, 0))
+
+        # Treeview Insert, path name to item id index for the count updates
+        # and {path name : {relative directory : item id}} for recursive paths
+        self.path_items = {}
+        self.breakdown_items = {}
+        self.breakdowns = {}
+        self.__insert_paths()
+
+        # Treeview Scrollbar configuration
+        y_scrollbar = ttk.Scrollbar(self, orient=tkinter.VERTICAL, command=self.path_tree_view.yview)
+        y_scrollbar.grid(row=0, column=4, sticky='ns', padx=(0, 5), pady=(5, 0))
+        self.path_tree_view.configure(yscroll=y_scrollbar.set)
+
+        # Treeview configure
+        self.path_tree_view.columnconfigure(0, weight=1)
+        self.path_tree_view.rowconfigure(0, weight=1)
+
+        # For later development, will open a window with the files list
+        self.path_tree_view.bind('<Double-1>', self.__tree_item_view)
+        self.path_tree_view.bind('<Return>', self.__tree_item_view)
+
+        # Button configuration
+        button_frame = tkinter.Frame(self)
+        button_frame.grid(column=0, row=1, columnspan=5, padx=(3), pady=(3), sticky='nesw')
+        for i in range(5):
+            button_frame.columnconfigure(i, minsize=43)
+        button_frame.columnconfigure(1, weight=1)
+        button_frame.rowconfigure(0, minsize=20)
+
+        # Files changed while stopped and log messages dropped before reaching the window
+        self.status_label = tkinter.Label(button_frame, text='', anchor='w', fg='#a04000')
+        self.status_label.grid(column=1, row=1, padx=(3), pady=(3), sticky='nesw')
+
+        button_update = tkinter.Button(button_frame, text='Update', command=self.__update, width=10)
+        button_update.grid(column=2, row=1, padx=(3, 0), pady=(3), sticky='nw')
+        button_config = tkinter.Button(button_frame, text='Settings', command=self.__configuration, width=10)
+        button_config.grid(column=3, row=1, padx=(0), pady=(3), sticky='nw')
+
+        # Check button configuration
+        self.entry = tkinter.IntVar()
+        self.entry.set(self.config_values.always_on_top)
+        self.__always_on_top()
+        always_on_top = tkinter.Checkbutton(button_frame, text='Always on top', variable=self.entry, onvalue=1, offvalue=0, command=self.__always_on_top)
+        always_on_top.grid(column=0, row=1, padx=(3), pady=(3), sticky='ne')
+
+        # Settings window saved a new configuration
+        self.bind('<<ConfigUpdated>>', self.__reload_config)
+
+        # Button close top right
+        self.protocol('WM_DELETE_WINDOW', self.__on_window_close)
+        self.after(PULL_INTERVAL, self.__pull_log_queue)
+        self.after(AGE_REFRESH_INTERVAL, self.__refresh_ages)
+
+
+    # Log and result handler
+    def __pull_log_queue(self):
+        r'''
+        Drain results and log messages within PULL_TIME_BUDGET seconds per tick
+        What is left is handled on the next tick, keeping the window responsive
+        '''
+        deadline = perf_counter() + PULL_TIME_BUDGET
+        latest_events = {}
+        while perf_counter() < deadline:
+            count_events = self.result_channel.drain(PULL_BATCH_SIZE)
+            if not count_events:
+                break
+            # Only the last event of each path is displayed, with the stats and rates of the earlier ones
+            for count_event in count_events:
+                previous = latest_events.get(count_event.path_name)
+                latest_events[count_event.path_name] = count_event if previous is None else merge_count_events(previous, count_event)
+        for count_event in latest_events.values():
+            self.__display_count(count_event)
+            for callback in list(self.count_subscribers.get(count_event.path_name, ())):
+                try:
+                    callback(count_event)
+                except Exception as error:
+                    logger.error(f'Count subscriber error {error}')
+        # Log records are shown by the console and file handlers, discard them here
+        # but show the summary of the dropped ones
+        messages = self.log_queue.drain()
+        if self.log_queue.last_drops:
+            self.status_label.configure(text=f'{datetime.now().strftime("%H:%M:%S")} {messages[0]}')
+        self.after(PULL_INTERVAL, self.__pull_log_queue)
+
+
+    def subscribe_count(self, path_name: str, callback) -> None:
+        r'''
+        Call callback(count_event) on the GUI thread for each count displayed for path_name
+        '''
+        self.count_subscribers.setdefault(path_name, []).append(callback)
+
+
+    def unsubscribe_count(self, path_name: str, callback) -> None:
+        callbacks = self.count_subscribers.get(path_name, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self.count_subscribers.pop(path_name, None)
+
+
+    def __display_count(self, count_event: CountEvent):
+        item_id = self.path_items.get(count_event.path_name)
+        if item_id is not None:
+            history = self.history.record(count_event.path_name, count_event.timestamp, count_event.count)
+            # Counts updated from events keep the stats of the last scan
+            if count_event.total_size is not None:
+                self.path_stats[count_event.path_name] = (count_event.total_size, count_event.oldest_mtime, count_event.newest_mtime)
+            if count_event.arrival_rate is not None:
+                self.path_rates[count_event.path_name] = (count_event.arrival_rate, count_event.departure_rate)
+            self.path_tree_view.item(item_id, values=(count_event.path_name, count_event.count, self.__rates_value(count_event.path_name),
+                *self.__stats_values(count_event.path_name), history.sparkline(TREND_WIDTH)))
+            self.__highlight(count_event.path_name, item_id)
+            if count_event.breakdown is not None:
+                self.__display_breakdown(item_id, count_event.path_name, count_event.breakdown)
+            if count_event.offline_changes is not None:
+                self.offline_changes[count_event.path_name] = count_event.offline_changes
+                changes = ', '.join(f'{path_name} +{added} -{removed}' for path_name, (added, removed) in self.offline_changes.items())
+                self.status_label.configure(text=f'Changed while stopped: {changes}')
+
+
+    def __rates_value(self, path_name: str) -> str:
+        if not path_name in self.path_rates:
+            return ''
+        arrival_rate, departure_rate = self.path_rates[path_name]
+        return f'+{arrival_rate:.1f} / -{departure_rate:.1f}'
+
+
+    def __stats_values(self, path_name: str, now: float | None=None) -> tuple:
+        r'''
+        Size, oldest and newest file age texts of the path, empty before its first scan
+        '''
+        if not path_name in self.path_stats:
+            return ('', '', '')
+        total_size, oldest_mtime, newest_mtime = self.path_stats[path_name]
+        now = time() if now is None else now
+        if oldest_mtime is None:
+            return (support_funcions.format_size(total_size), '', '')
+        return (support_funcions.format_size(total_size), support_funcions.format_age(now - oldest_mtime), support_funcions.format_age(now - newest_mtime))
+
+
+    def __highlight(self, path_name: str, item_id: str, now: float | None=None):
+        r'''
+        Tag the row warning or critical from the oldest file age, in minutes
+        '''
+        oldest_mtime = self.path_stats.get(path_name, (0, None, None))[1]
+        tags = ()
+        if oldest_mtime is not None:
+            age = ((time() if now is None else now) - oldest_mtime) / 60
+            if self.config_values.age_critical and age >= self.config_values.age_critical:
+                tags = ('critical',)
+            elif self.config_values.age_warning and age >= self.config_values.age_warning:
+                tags = ('warning',)
+        self.path_tree_view.item(item_id, tags=tags)
+
+
+    def __refresh_ages(self):
+        r'''
+        Files get older without new scans, update the age columns and highlights
+        '''
+        now = time()
+        for path_name, item_id in self.path_items.items():
+            if path_name in self.path_stats:
+                _, oldest, newest = self.__stats_values(path_name, now)
+                self.path_tree_view.set(item_id, 'oldest', oldest)
+                self.path_tree_view.set(item_id, 'newest', newest)
+            self.__highlight(path_name, item_id, now)
+        self.after(AGE_REFRESH_INTERVAL, self.__refresh_ages)
+
+
+    def __display_breakdown(self, parent_id: str, path_name: str, breakdown: dict):
+        r'''
+        Sub directory counts of a recursive path as child rows, only when the breakdown changed
+        '''
+        if self.breakdowns.get(path_name) == breakdown:
+            return
+        self.breakdowns[path_name] = breakdown
+        items = self.breakdown_items.setdefault(path_name, {})
+        for directory in [directory for directory in items.keys() if not directory in breakdown]:
+            self.path_tree_view.delete(items.pop(directory))
+        for index, directory in enumerate(sorted(breakdown.keys())):
+            item_id = items.get(directory)
+            if item_id is None:
+                items[directory] = self.path_tree_view.insert(parent_id, index, values=(directory, breakdown[directory]))
+            else:
+                self.path_tree_view.item(item_id, values=(directory, breakdown[directory]))
+                self.path_tree_view.move(item_id, parent_id, index)
+
+
+    def __clear_breakdown(self, path_name: str):
+        for item_id in self.breakdown_items.pop(path_name, {}).values():
+            self.path_tree_view.delete(item_id)
+        self.breakdowns.pop(path_name, None)
+
+
+    def __reload_config(self, event=None):
+        r'''
+        Hand the new configuration to the monitor thread and update only the changed rows
+        '''
+        try:
+            config = support_funcions.load_configuration()
+        except Exception as error:
+            logger.error(f'Configuration error, keeping current values {error}')
+            messagebox.showerror('Configuration error', f'Could not load configuration {error}')
+            return
+        added, removed, changed = support_funcions.diff_path_list(self.config_values.path_list, config.path_list)
+        self.monitor.apply_config(config)
+        self.config_values = config
+        for path_value in removed:
+            self.history.remove(path_value.name)
+            self.path_stats.pop(path_value.name, None)
+            self.path_rates.pop(path_value.name, None)
+            self.breakdown_items.pop(path_value.name, None)
+            self.breakdowns.pop(path_value.name, None)
+            self.path_tree_view.delete(self.path_items.pop(path_value.name))
+        for _, path_value in changed:
+            self.__clear_breakdown(path_value.name)
+            self.path_stats.pop(path_value.name, None)
+            self.path_rates.pop(path_value.name, None)
+            self.path_tree_view.item(self.path_items[path_value.name], values=(path_value.name, path_value.path), tags=())
+        for path_value in added:
+            self.path_items[path_value.name] = self.path_tree_view.insert('', tkinter.END, values=(path_value.name, path_value.path))
+        for index, path_value in enumerate(self.config_values.path_list):
+            self.path_tree_view.move(self.path_items[path_value.name], '', index)
+            # Age thresholds may have changed
+            self.__highlight(path_value.name, self.path_items[path_value.name])
+        logger.debug(f'Configuration reloaded, {len(added)} added, {len(removed)} removed, {len(changed)} changed')
+
+
+    def __insert_paths(self):
+        self.path_items = {}
+        for path_values in self.config_values.path_list:
+            self.path_items[path_values.name] = self.path_tree_view.insert('', tkinter.END, values=(path_values.name, path_values.path))
+
+
+    def __always_on_top(self):
+        r'''
+        Set window do always on top
+        '''
+        logger.info(f'Always on top {self.entry.get()}')
+        self.attributes('-topmost', self.entry.get())
+        self.config_values.always_on_top = self.entry.get()
+        support_funcions.save_config_on_change(self.config_values)
+
+
+    def __update(self):
+        r'''
+        Update values from treeview
+        '''
+        logger.info('Update clicked')
+        self.monitor.request_rescan()
+
+
+    def __export_history(self):
+        r'''
+        Save the count history of every path as csv
+        '''
+        file_path = filedialog.asksaveasfilename(title='Export history', defaultextension='.csv', initialfile='count_history.csv', filetypes=[('CSV', '*.csv')])
+        if not file_path:
+            return
+        try:
+            if not self.history.export_csv(file_path):
+                messagebox.showinfo('Export history', 'No samples to export yet')
+        except Exception as error:
+            logger.error(f'Could not export history {error}')
+            messagebox.showerror('Export history', f'Could not export history due {error}')
+
+
+    def __configuration(self):
+        logger.debug('Config button clicked')
+        self.config_window = Config_Window(self, self.config_values, (400, 300), support_funcions.CONFIG_FILE)
+
+
+    def __on_window_close(self):
+        self.__quit_window()
+
+
+    def __quit_window(self):
+        if messagebox.askokcancel('Quit', 'Do you want to quit?'):
+            # Wait for the snapshots to be saved
+            self.monitor.stop(timeout=10)
+            support_funcions.save_config_on_change(support_funcions.update_win_size_pos(self.geometry(), 'main', self.config_values))
+            logger.info('Forcing kill thread if it is open')
+            self.after(150, self.deiconify)
+            self.destroy()
+
+
+    def __tree_item_view(self, event=None):
+        try:
+            item_id = self.path_tree_view.selection()[0]
+            # Sub directory rows open their recursive path
+            item_id = self.path_tree_view.parent(item_id) or item_id
+            selected_item = self.path_tree_view.item(item_id)['values']
+            self.list_view = ListView(self, self.config_values.get_path_details(selected_item[0]), self.config_values, (500, 500))
+        except:
+            messagebox.showerror('Selection error', 'No row is selected')
+        logger.debug('Treeview double click, return')
+
+
+    def __about_command(self):
+        logger.info('About clicked')
+        self.about = About(self, self.config_values.always_on_top,
+            'About', '''
+            Application name: Directory Monitor
+            Version: 0.10.00
+            Developed by: Akio Fujitani
+            e-mail: akiofujitani@gmail.com
+        ''', file_handler.resource_path('./Icon/Bedo.jpg'))
@@ -0,0 +1,227 @@
+import logging
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+logger = logging.getLogger('metrics')
+
+
+# Seconds, the +Inf bucket is implicit
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(label_value: str) -> str:
+    return str(label_value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    r'''
+    Monotonic value per label value (label_value '' for unlabelled)
+    '''
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, label: str | None=None) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values = {}
+        self.lock = Lock()
+
+
+    def inc(self, amount: float=1, label_value: str='') -> None:
+        with self.lock:
+            self.values[label_value] = self.values.get(label_value, 0) + amount
+
+
+    def remove(self, label_value: str) -> None:
+        with self.lock:
+            self.values.pop(label_value, None)
+
+
+    def samples(self) -> list:
+        with self.lock:
+            return [(self.name, label_value, value) for label_value, value in self.values.items()]
+
+
+class Gauge(Counter):
+    r'''
+    Value that goes up and down, optionally read from a callback on render
+    '''
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, label: str | None=None, callback=None) -> None:
+        super().__init__(name, help_text, label)
+        self.callback = callback
+
+
+    def set(self, value: float, label_value: str='') -> None:
+        with self.lock:
+            self.values[label_value] = value
+
+
+    def samples(self) -> list:
+        if self.callback is not None:
+            return [(self.name, '', self.callback())]
+        return super().samples()
+
+
+class Histogram:
+    r'''
+    Fixed bucket histogram per label value
+    Each series is one list allocated on its first observation:
+    non cumulative bucket counts (last one is +Inf) followed by the sum
+    '''
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label: str | None=None, buckets: tuple=DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.bounds = tuple(buckets)
+        self.series = {}
+        self.lock = Lock()
+
+
+    def observe(self, value: float, label_value: str='') -> None:
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = [0] * (len(self.bounds) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+
+    def remove(self, label_value: str) -> None:
+        with self.lock:
+            self.series.pop(label_value, None)
+
+
+    def samples(self) -> list:
+        with self.lock:
+            series_copy = {label_value : list(series) for label_value, series in self.series.items()}
+        samples = []
+        for label_value, series in series_copy.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds + ('+Inf',), series[:-1]):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', label_value, cumulative, ('le', bound)))
+            samples.append((f'{self.name}_sum', label_value, series[-1]))
+            samples.append((f'{self.name}_count', label_value, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    r'''
+    Metrics Registry
+    ----------------
+
+    Holds the metrics and renders them in the Prometheus plain text exposition format
+    '''
+    def __init__(self) -> None:
+        self.metrics = {}
+
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+
+    def counter(self, name: str, help_text: str, label: str | None=None) -> Counter:
+        return self.register(Counter(name, help_text, label))
+
+
+    def gauge(self, name: str, help_text: str, label: str | None=None, callback=None) -> Gauge:
+        return self.register(Gauge(name, help_text, label, callback))
+
+
+    def histogram(self, name: str, help_text: str, label: str | None=None, buckets: tuple=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, label, buckets))
+
+
+    def remove_label(self, label_value: str) -> None:
+        r'''
+        Drop a label value (removed path) from every labelled metric
+        '''
+        for metric in self.metrics.values():
+            if metric.label:
+                metric.remove(label_value)
+
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample in metric.samples():
+                sample_name, label_value, value = sample[:3]
+                labels = []
+                if metric.label and label_value != '':
+                    labels.append(f'{metric.label}="{_escape(label_value)}"')
+                if len(sample) > 3:
+                    labels.append(f'{sample[3][0]}="{sample[3][1]}"')
+                label_text = '{' + ','.join(labels) + '}' if labels else ''
+                lines.append(f'{sample_name}{label_text} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    r'''
+    Metrics Server
+    --------------
+
+    Serves registry.render() on http://host:port/metrics from a daemon thread
+    Bound to localhost by default
+    '''
+    def __init__(self, registry: MetricsRegistry, port: int, host: str='127.0.0.1') -> None:
+        self.registry = registry
+        self.address = (host, port)
+        self.server = None
+        self.thread = None
+
+
+    def start(self) -> None:
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.split('?')[0] in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f'{self.address_string()} {format % args}')
+
+        self.server = ThreadingHTTPServer(self.address, MetricsHandler)
+        self.thread = Thread(target=self.server.serve_forever, daemon=True, name='Metrics Server')
+        self.thread.start()
+        logger.info(f'Metrics available on http://{self.address[0]}:{self.server.server_port}/metrics')
+
+
+    def stop(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+# Shared by the scanner modules, like the loggers
+registry = MetricsRegistry()
+path_files = registry.gauge('directory_monitor_path_files', 'Files counted in the path', 'path')
+scan_duration = registry.histogram('directory_monitor_scan_duration_seconds', 'Time to count a path', 'path')
+scan_errors = registry.counter('directory_monitor_scan_errors_total', 'Failed path counts', 'path')
+path_bytes = registry.gauge('directory_monitor_path_bytes', 'Total size of the counted files', 'path')
+path_oldest_file = registry.gauge('directory_monitor_path_oldest_file_timestamp_seconds', 'Modification time of the oldest counted file', 'path')
+path_arrival_rate = registry.gauge('directory_monitor_path_arrivals_per_minute', 'Files arriving per minute, moving average', 'path')
+path_departure_rate = registry.gauge('directory_monitor_path_departures_per_minute', 'Files leaving per minute, moving average', 'path')
+cycle_duration = registry.histogram('directory_monitor_cycle_duration_seconds', 'Time to count every due path in a cycle')
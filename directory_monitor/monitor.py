@@ -0,0 +1,324 @@
+import logging, support_funcions, inotify_watcher, metrics, file_handler, snapshot_store, snapshot_cache
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from threading import Event, Thread
+from time import monotonic, time
+from classes import ConfigurationValues, PathDetails
+from result_channel import ResultChannel
+from scheduler import AdaptiveScheduler
+from snapshot_store import SnapshotStore
+
+logger = logging.getLogger('monitor')
+
+# File names of each side written to the log for a path changed while stopped
+OFFLINE_LOG_NAMES = 5
+
+
+class DirectoryMonitor:
+    r'''
+    Directory Monitor
+    -----------------
+
+    Runs the count loop in a background thread, publishing to the result channel.
+    Watched paths are updated from inotify events, the others are polled by the adaptive
+    scheduler, each on its own interval. Events only carry the count, so watched paths
+    are scanned once per update time for their size, file ages and flow rates, a directory
+    stat when unchanged.
+
+    New configurations are applied by the loop itself between waits, only the paths
+    added, removed or changed are started, stopped or counted again. Unchanged paths
+    keep their watch and cached state.
+
+    With a snapshot store the last stats are published as soon as the loop starts and
+    the snapshots are saved when it stops. offline_changes holds
+    {path name : (added names, removed names)} found while the monitor was stopped,
+    also logged as a warning and published with the path count (CountEvent.offline_changes).
+    '''
+    def __init__(self, config: ConfigurationValues, channel: ResultChannel, store: SnapshotStore | None=None) -> None:
+        self.config = config
+        self.channel = channel
+        self.store = store
+        self.offline_changes = {}
+        self.stop_event = Event()
+        self.wake_event = Event()
+        self.rescan_event = Event()
+        self.pending_configs = Queue()
+        self.watcher = None
+        self.stats_due = 0.0
+        self.scheduler = AdaptiveScheduler(config.update_time)
+        self.thread = None
+
+
+    def start(self) -> None:
+        self.stop_event.clear()
+        self.thread = Thread(target=self.run, daemon=True, name='Directory Monitor')
+        self.thread.start()
+
+
+    def stop(self, timeout: float | None=None) -> None:
+        r'''
+        Ask the loop to finish, waiting up to timeout if informed
+        '''
+        self.stop_event.set()
+        self.wake_event.set()
+        if timeout is not None and self.thread:
+            self.thread.join(timeout)
+
+
+    def apply_config(self, config: ConfigurationValues) -> None:
+        r'''
+        Queue a new configuration, returns immediately
+        '''
+        self.pending_configs.put(config)
+        self.wake_event.set()
+
+
+    def request_rescan(self) -> None:
+        r'''
+        Count every path again on the next wake up
+        '''
+        self.rescan_event.set()
+        self.wake_event.set()
+
+
+    def run(self) -> None:
+        if self.store:
+            self.__warm_start()
+        if inotify_watcher.inotify_available():
+            try:
+                self.watcher = inotify_watcher.DirectoryWatcher()
+            except OSError as error:
+                logger.warning(f'Watcher not started, polling all paths {error}')
+        self.__schedule(self.__add_paths(self.config.path_list))
+        try:
+            while not self.stop_event.is_set():
+                due_list = self.scheduler.pop_due(monotonic())
+                if due_list:
+                    changed = support_funcions.update_count(self.config, self.channel, due_list)
+                    now = monotonic()
+                    for path_value in due_list:
+                        interval = self.scheduler.reschedule(path_value, changed.get(path_value.name, True), now)
+                        logger.debug(f'{path_value.name} next scan in {interval}s')
+                if self.watcher and self.watcher.counts and monotonic() >= self.stats_due:
+                    self.__refresh_stats()
+                time_to_next = self.scheduler.time_to_next(monotonic())
+                self.__wait(self.config.update_time if time_to_next is None else time_to_next)
+        finally:
+            if self.watcher:
+                self.watcher.close()
+                self.watcher = None
+            if self.store:
+                self.__save_snapshots()
+
+
+    def __refresh_stats(self) -> None:
+        r'''
+        Scan the watched paths, publishing their stats
+        The watched counts follow the scan, a path differing is listed again by the watcher
+        '''
+        path_list = [path_value for path_value in self.config.path_list if path_value.name in self.watcher.counts]
+        self.stats_due = monotonic() + self.config.update_time
+        support_funcions.update_count(self.config, self.channel, path_list)
+        for path_value in path_list:
+            try:
+                # Cache hit unless the directory changed since the scan
+                scan_count = support_funcions.path_cache.count(path_value, support_funcions.path_stats).count
+            except Exception as error:
+                logger.error(f'Could not count {path_value.name} {error}')
+                continue
+            count = self.watcher.resync(path_value, scan_count)
+            if count != scan_count:
+                self.__publish({path_value.name : count})
+
+
+    def __warm_start(self) -> None:
+        r'''
+        Publish the stored stats, then check each path against its stored snapshot
+        Unchanged directories seed the snapshot cache so their first scan is not a listing,
+        changed ones are listed once to find the files added and removed while stopped,
+        seeding the cache and publishing their new stats with the offline changes
+        '''
+        try:
+            stored = self.store.load()
+        except Exception as error:
+            logger.warning(f'Could not load snapshots {error}')
+            return
+        valid_list = [(path_value, stored[path_value.name]) for path_value in self.config.path_list
+            if path_value.name in stored and snapshot_store.matches(stored[path_value.name], path_value)]
+        for path_value, snapshot in valid_list:
+            self.channel.publish_count(path_value.name, snapshot.stats.count, stats=snapshot.stats)
+            metrics.path_files.set(snapshot.stats.count, path_value.name)
+        for path_value, snapshot in valid_list:
+            if self.stop_event.is_set():
+                return
+            if snapshot.files is None:
+                continue
+            try:
+                signature = file_handler.directory_signature(path_value.path)
+                if signature is not None and signature == snapshot.signature:
+                    support_funcions.path_cache.seed(path_value, signature, snapshot.stats)
+                    continue
+                names = set()
+                listed = time()
+                stats = file_handler.file_stats(path_value.path, path_value.extension, path_value.ignore_regex, names=names)
+                support_funcions.path_cache.seed(path_value, signature, stats, listed)
+                added, removed = names - snapshot.files, snapshot.files - names
+                offline_changes = None
+                if added or removed:
+                    self.offline_changes[path_value.name] = (sorted(added), sorted(removed))
+                    offline_changes = (len(added), len(removed))
+                    logger.warning(f'{path_value.name} changed while stopped, {len(added)} added {sorted(added)[:OFFLINE_LOG_NAMES]}, '
+                        f'{len(removed)} removed {sorted(removed)[:OFFLINE_LOG_NAMES]}')
+                self.channel.publish_count(path_value.name, stats.count, stats=stats, offline_changes=offline_changes)
+                metrics.path_files.set(stats.count, path_value.name)
+            except Exception as error:
+                logger.error(f'Could not check {path_value.name} snapshot {error}')
+
+
+    def __save_snapshots(self) -> None:
+        r'''
+        Store stats, signature and file set of every path, signature taken before the listing
+        A flat path whose directory signature is the stored one keeps its stored file set,
+        only the paths changed since are listed again, in a thread pool with config.scan_workers.
+        Recursive paths keep stats and signature only
+        '''
+        try:
+            stored = self.store.load()
+        except Exception as error:
+            logger.warning(f'Could not load snapshots {error}')
+            stored = {}
+        snapshots = []
+        changed_list = []
+        for path_value in self.config.path_list:
+            try:
+                signature = file_handler.directory_signature(path_value.path)
+                snapshot = stored.get(path_value.name)
+                if path_value.recursive:
+                    stats = support_funcions.subtree_cache.count_changed(path_value, support_funcions.stats_directory)[0]
+                    snapshots.append(snapshot_store.snapshot_of(path_value, stats, signature, None))
+                elif signature is not None and snapshot and snapshot.files is not None and snapshot.signature == signature and snapshot_store.matches(snapshot, path_value):
+                    stats = support_funcions.path_cache.get(path_value, signature) or snapshot.stats
+                    snapshots.append(snapshot_store.snapshot_of(path_value, stats, signature, snapshot.files))
+                else:
+                    changed_list.append(path_value)
+            except Exception as error:
+                logger.error(f'Could not snapshot {path_value.name} {error}')
+        if self.config.scan_workers > 1 and len(changed_list) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.config.scan_workers, len(changed_list)), thread_name_prefix='Snapshot') as executor:
+                listed = list(executor.map(self.__list_snapshot, changed_list))
+        else:
+            listed = [self.__list_snapshot(path_value) for path_value in changed_list]
+        snapshots.extend(snapshot for snapshot in listed if snapshot is not None)
+        logger.debug(f'{len(changed_list)} of {len(self.config.path_list)} paths listed for the snapshots')
+        try:
+            self.store.save(snapshots)
+        except Exception as error:
+            logger.error(f'Could not save snapshots {error}')
+
+
+    def __list_snapshot(self, path_value: PathDetails) -> snapshot_store.StoredSnapshot | None:
+        r'''
+        List a flat path once for its stats and file set, None if it can not be listed
+        The signature is not stored if the directory changed within MTIME_GRANULARITY of the
+        listing, the next warm start lists it again
+        '''
+        try:
+            signature = file_handler.directory_signature(path_value.path)
+            names = set()
+            listed = time()
+            stats = file_handler.file_stats(path_value.path, path_value.extension, path_value.ignore_regex, names=names)
+            if not snapshot_cache.settled(signature, listed):
+                signature = None
+            return snapshot_store.snapshot_of(path_value, stats, signature, names)
+        except Exception as error:
+            logger.error(f'Could not snapshot {path_value.name} {error}')
+            return None
+
+
+    def __wait(self, timeout: float) -> None:
+        r'''
+        Publish watched counts as events arrive until the next scheduled scan or stats refresh
+        Pending configurations are applied meanwhile, a rescan request ends the wait
+        '''
+        deadline = monotonic() + timeout
+        while not self.stop_event.is_set():
+            if self.watcher and self.watcher.counts:
+                deadline = min(deadline, self.stats_due)
+            if self.__apply_pending():
+                return
+            if self.rescan_event.is_set():
+                self.rescan_event.clear()
+                if self.watcher:
+                    self.__publish(self.watcher.rescan())
+                    self.stats_due = 0.0
+                self.scheduler.reset(monotonic())
+                return
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return
+            if self.watcher:
+                self.__publish(self.watcher.read_events(min(remaining, 1)))
+                lost_list = self.watcher.pop_lost()
+                if lost_list:
+                    self.__schedule(lost_list)
+                    return
+            else:
+                self.wake_event.wait(remaining)
+            self.wake_event.clear()
+
+
+    def __apply_pending(self) -> bool:
+        r'''
+        Apply queued configurations, return True if any was applied
+        '''
+        applied = False
+        while True:
+            try:
+                new_config = self.pending_configs.get_nowait()
+            except Empty:
+                return applied
+            applied = True
+            added, removed, changed = support_funcions.diff_path_list(self.config.path_list, new_config.path_list)
+            for path_value in removed + [old_value for old_value, _ in changed]:
+                self.__remove_path(path_value)
+            self.config = new_config
+            self.scheduler.default_interval = new_config.update_time
+            self.__schedule(self.__add_paths(added + [new_value for _, new_value in changed]))
+            logger.info(f'Configuration applied, {len(added)} added, {len(removed)} removed, {len(changed)} changed')
+
+
+    def __schedule(self, path_list: list) -> None:
+        r'''
+        Poll the paths from now on, first scan right away
+        '''
+        now = monotonic()
+        for path_value in path_list:
+            self.scheduler.add(path_value, now)
+
+
+    def __add_paths(self, path_list: list) -> list:
+        r'''
+        Watch what is possible and publish its count, return the paths to be polled
+        '''
+        if not self.watcher:
+            return list(path_list)
+        poll_list = self.watcher.watch(path_list)
+        self.__publish({path_value.name : self.watcher.counts[path_value.name] for path_value in path_list if path_value.name in self.watcher.counts})
+        self.stats_due = 0.0
+        return poll_list
+
+
+    def __remove_path(self, path_value: PathDetails) -> None:
+        if self.watcher:
+            self.watcher.remove_path(path_value.name)
+        self.scheduler.remove(path_value.name)
+        support_funcions.path_cache.discard(path_value.path)
+        support_funcions.subtree_cache.discard(path_value.path)
+        support_funcions.flow_rates.discard(path_value.name)
+        metrics.registry.remove_label(path_value.name)
+
+
+    def __publish(self, counts: dict) -> None:
+        for path_name, quantity in counts.items():
+            self.channel.publish_count(path_name, quantity)
+            metrics.path_files.set(quantity, path_name)
@@ -0,0 +1,76 @@
+import logging
+from queue import Queue, Empty
+from time import time
+from dataclasses import replace
+from classes import CountEvent
+from file_handler import FileStats
+
+logger = logging.getLogger('result_channel')
+
+
+class ResultChannel:
+    r'''
+    Result Channel
+    --------------
+
+    Typed queue of CountEvent from the scanner to its consumers (GUI, headless output).
+    Unbounded on purpose, a count is never dropped like log messages are.
+    '''
+    def __init__(self) -> None:
+        self.queue = Queue()
+
+
+    def publish(self, event: CountEvent) -> None:
+        self.queue.put(event)
+
+
+    def publish_count(self, path_name: str, count: int, duration: float=0.0, breakdown: dict | None=None, stats: FileStats | None=None, rates: tuple | None=None, offline_changes: tuple | None=None) -> None:
+        r'''
+        Build and publish a CountEvent stamped with the current time
+        duration is the scan time in seconds, 0 for counts updated from events
+        stats adds the size and modification time aggregates of the scan
+        rates adds (files in per minute, files out per minute)
+        offline_changes adds (files added, files removed) while the monitor was stopped
+        '''
+        logger.debug(f'{path_name} count {count} in {duration:.4f}s')
+        total_size, oldest_mtime, newest_mtime = (None, None, None) if stats is None else stats[1:]
+        arrival_rate, departure_rate = (None, None) if rates is None else rates
+        self.publish(CountEvent(path_name, count, duration, time(), breakdown, total_size, oldest_mtime, newest_mtime, arrival_rate, departure_rate, offline_changes))
+
+
+    def get(self, timeout: float | None=None) -> CountEvent | None:
+        try:
+            return self.queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+
+    def drain(self, max_items: int | None=None) -> list:
+        r'''
+        Get every pending event without blocking, up to max_items
+        '''
+        events = []
+        while max_items is None or len(events) < max_items:
+            try:
+                events.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return events
+
+
+def merge_count_events(previous: CountEvent, latest: CountEvent) -> CountEvent:
+    r'''
+    Latest event keeping the breakdown, stats, rates and offline changes of previous where latest has none
+    Used when only one event per path is displayed, a count from a watcher event must not
+    hide the stats of the scan published just before it
+    '''
+    changes = {}
+    if latest.breakdown is None and previous.breakdown is not None:
+        changes['breakdown'] = previous.breakdown
+    if latest.total_size is None and previous.total_size is not None:
+        changes.update(total_size=previous.total_size, oldest_mtime=previous.oldest_mtime, newest_mtime=previous.newest_mtime)
+    if latest.arrival_rate is None and previous.arrival_rate is not None:
+        changes.update(arrival_rate=previous.arrival_rate, departure_rate=previous.departure_rate)
+    if latest.offline_changes is None and previous.offline_changes is not None:
+        changes['offline_changes'] = previous.offline_changes
+    return replace(latest, **changes) if changes else latest
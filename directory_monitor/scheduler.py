@@ -0,0 +1,108 @@
+import heapq, logging
+from itertools import count
+from classes import PathDetails
+
+logger = logging.getLogger('scheduler')
+
+
+class AdaptiveScheduler:
+    r'''
+    Adaptive Scheduler
+    ------------------
+
+    Each path has its own interval between min and max bounds.
+    While a directory stays unchanged the interval doubles up to the max,
+    a change snaps it back to the min. Due paths are returned by priority
+    (higher first).
+
+    min_interval of 0 falls back to default_interval. max_interval of 0 (the
+    default) is the min, backing off is only done when max_interval is set
+    '''
+    def __init__(self, default_interval: float) -> None:
+        self.default_interval = default_interval
+        self.heap = []
+        self.entries = {}
+        self.intervals = {}
+        self.sequence = count()
+
+
+    def bounds(self, path_value: PathDetails) -> tuple:
+        min_interval = path_value.min_interval or self.default_interval
+        max_interval = max(path_value.max_interval, min_interval)
+        return min_interval, max_interval
+
+
+    def add(self, path_value: PathDetails, due: float) -> None:
+        self.intervals[path_value.name] = self.bounds(path_value)[0]
+        self.__push(path_value, due)
+
+
+    def remove(self, path_name: str) -> None:
+        self.__remove_entry(path_name)
+        self.intervals.pop(path_name, None)
+
+
+    def __contains__(self, path_name: str) -> bool:
+        return path_name in self.entries
+
+
+    def pop_due(self, now: float) -> list:
+        r'''
+        Remove and return the paths due at now, higher priority first
+        '''
+        due_list = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            path_value = entry[-1]
+            if path_value is None:
+                continue
+            del self.entries[path_value.name]
+            due_list.append(path_value)
+        due_list.sort(key=lambda path_value : -path_value.priority)
+        return due_list
+
+
+    def reschedule(self, path_value: PathDetails, changed: bool, now: float) -> float:
+        r'''
+        Schedule the next scan after a scan result, returning the interval used
+        '''
+        min_interval, max_interval = self.bounds(path_value)
+        if changed:
+            interval = min_interval
+        else:
+            interval = min(self.intervals.get(path_value.name, min_interval) * 2, max_interval)
+        self.intervals[path_value.name] = interval
+        self.__push(path_value, now + interval)
+        return interval
+
+
+    def reset(self, now: float) -> None:
+        r'''
+        Make every path due now at its minimum interval
+        '''
+        path_list = [entry[-1] for entry in self.entries.values()]
+        for path_value in path_list:
+            self.remove(path_value.name)
+            self.add(path_value, now)
+
+
+    def time_to_next(self, now: float) -> float | None:
+        while self.heap and self.heap[0][-1] is None:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return max(self.heap[0][0] - now, 0)
+
+
+    def __push(self, path_value: PathDetails, due: float) -> None:
+        self.__remove_entry(path_value.name)
+        entry = [due, -path_value.priority, next(self.sequence), path_value]
+        self.entries[path_value.name] = entry
+        heapq.heappush(self.heap, entry)
+
+
+    def __remove_entry(self, path_name: str) -> None:
+        entry = self.entries.pop(path_name, None)
+        if entry is not None:
+            # Lazy removal, the heap entry is skipped when popped
+            entry[-1] = None
@@ -0,0 +1,212 @@
+import logging, os, file_handler
+from threading import Lock
+from time import monotonic, time
+from classes import PathDetails
+
+logger = logging.getLogger('snapshot_cache')
+
+# Coarsest directory mtime resolution expected in seconds (FAT, some NAS and SMB shares),
+# an entry created in the same tick as the listing leaves the mtime as it was
+MTIME_GRANULARITY = 2
+
+
+def settled(signature: tuple | None, listed: float) -> bool:
+    r'''
+    Directory signature taken before a listing started at listed (epoch seconds) can be kept,
+    its mtime being at least MTIME_GRANULARITY older than the listing
+    A more recent mtime may not change for the files created right after, listed again next time
+    '''
+    return bool(signature) and listed - signature[0] / 1e9 >= MTIME_GRANULARITY
+
+
+class DirectorySnapshotCache:
+    r'''
+    Directory Snapshot Cache
+    ------------------------
+
+    Keep the last count of each path keyed on the directory st_mtime_ns and st_ino.
+    Creating, deleting or renaming an entry changes the directory mtime, so while
+    both values are the same the previous count is reused without listing again.
+    The count is whatever the counter returns (FileStats for the scans).
+
+    Writing to an existing file does not change the directory mtime, so values that
+    depend on the file contents (size, modification times) go stale on an unchanged
+    directory. With max_age, a snapshot older than max_age seconds is listed again
+    even if the signature is the same, reported as unchanged.
+
+    A listing is only kept if the directory mtime is MTIME_GRANULARITY older than it,
+    otherwise a file created in the same mtime tick would never be counted.
+    '''
+    def __init__(self, max_age: float | None=None) -> None:
+        self.max_age = max_age
+        self.snapshots = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+
+    def count(self, path_value: PathDetails, counter) -> int:
+        r'''
+        Return cached count if directory is unchanged, otherwise call counter(path_value)
+        '''
+        return self.count_changed(path_value, counter)[0]
+
+
+    def count_changed(self, path_value: PathDetails, counter) -> tuple:
+        r'''
+        Same as count, returning (count, changed)
+        changed is False only when the cached snapshot was reused
+        '''
+        key = (path_value.path, path_value.extension, path_value.ignore)
+        try:
+            stat = os.stat(path_value.path)
+            signature = (stat.st_mtime_ns, stat.st_ino)
+        except FileNotFoundError:
+            signature = None
+        now = monotonic()
+        listed = time()
+        with self.lock:
+            cached = self.snapshots.get(key)
+            unchanged = bool(signature and cached and cached[0] == signature)
+            if unchanged and (self.max_age is None or now - cached[2] < self.max_age):
+                self.hits += 1
+                return cached[1], False
+            self.misses += 1
+        # Signature is taken before listing, a change during the listing only forces a new listing next time
+        count = counter(path_value)
+        with self.lock:
+            if settled(signature, listed):
+                self.snapshots[key] = (signature, count, now)
+            else:
+                self.snapshots.pop(key, None)
+        return count, not unchanged
+
+
+    def get(self, path_value: PathDetails, signature: tuple | None):
+        r'''
+        Cached count if taken with signature, None otherwise
+        '''
+        with self.lock:
+            cached = self.snapshots.get((path_value.path, path_value.extension, path_value.ignore))
+        if signature and cached and cached[0] == signature:
+            return cached[1]
+        return None
+
+
+    def seed(self, path_value: PathDetails, signature: tuple | None, count, listed: float | None=None) -> None:
+        r'''
+        Store a count known for the signature (stored snapshot), the next count is a hit if unchanged
+        Not stored while the directory mtime is within MTIME_GRANULARITY of the listing (listed, now by default)
+        '''
+        if settled(signature, time() if listed is None else listed):
+            with self.lock:
+                self.snapshots[(path_value.path, path_value.extension, path_value.ignore)] = (signature, count, monotonic())
+
+
+    def discard(self, path: str) -> None:
+        with self.lock:
+            for key in [key for key in self.snapshots.keys() if key[0] == path]:
+                del self.snapshots[key]
+
+
+    def clear(self) -> None:
+        with self.lock:
+            self.snapshots.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'hits' : self.hits, 'misses' : self.misses, 'entries' : len(self.snapshots)}
+
+
+class SubtreeSnapshotCache:
+    r'''
+    Subtree Snapshot Cache
+    ----------------------
+
+    FileStats of recursive paths kept per sub directory, with the directory signature
+    (st_mtime_ns, st_ino) and its sub directories. A directory mtime only changes with
+    its own entries, so each cycle takes one stat per directory and lists again only
+    the directories that changed, or whose snapshot is older than max_age seconds
+    or whose mtime was within MTIME_GRANULARITY of its listing (see DirectorySnapshotCache).
+    '''
+    def __init__(self, max_age: float | None=None) -> None:
+        self.max_age = max_age
+        self.trees = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+
+    def count_changed(self, path_value: PathDetails, counter) -> tuple:
+        r'''
+        Return (FileStats, changed, {relative directory : count}) for the subtree
+        counter(directory, path_value) lists one directory returning (FileStats, sub directory paths)
+        Only directories with matching files are in the breakdown, '.' being the path itself
+        '''
+        key = (path_value.path, path_value.extension, path_value.ignore)
+        with self.lock:
+            previous = self.trees.get(key, {})
+        current = {}
+        changed = False
+        breakdown = {}
+        hits = 0
+        now = monotonic()
+        pending = [path_value.path]
+        while pending:
+            directory = pending.pop()
+            try:
+                stat = os.stat(directory)
+                signature = (stat.st_mtime_ns, stat.st_ino)
+            except FileNotFoundError:
+                signature = None
+            cached = previous.get(directory)
+            unchanged = bool(signature and cached and cached[0] == signature)
+            if unchanged and (self.max_age is None or now - cached[3] < self.max_age):
+                stats, subdirectories, taken = cached[1], cached[2], cached[3]
+                hits += 1
+            else:
+                changed = changed or not unchanged
+                taken = now
+                listed = time()
+                try:
+                    stats, subdirectories = counter(directory, path_value)
+                except FileNotFoundError:
+                    # Sub directory removed after its parent was listed
+                    if directory == path_value.path:
+                        raise
+                    continue
+                if not settled(signature, listed):
+                    # No signature, listed again next cycle
+                    signature = None
+            current[directory] = (signature, stats, subdirectories, taken)
+            if stats.count:
+                breakdown[os.path.relpath(directory, path_value.path)] = stats.count
+            pending.extend(subdirectories)
+        if len(current) != len(previous):
+            changed = True
+        with self.lock:
+            self.trees[key] = current
+            self.hits += hits
+            self.misses += len(current) - hits
+        return file_handler.merge_file_stats(stats for _, stats, _, _ in current.values()), changed, breakdown
+
+
+    def discard(self, path: str) -> None:
+        with self.lock:
+            for key in [key for key in self.trees.keys() if key[0] == path]:
+                del self.trees[key]
+
+
+    def clear(self) -> None:
+        with self.lock:
+            self.trees.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'hits' : self.hits, 'misses' : self.misses, 'directories' : sum(len(tree) for tree in self.trees.values())}
@@ -0,0 +1,113 @@
+import logging, sqlite3, zlib
+from collections import namedtuple
+from time import time
+from classes import PathDetails
+from file_handler import FileStats
+
+logger = logging.getLogger('snapshot_store')
+
+
+StoredSnapshot = namedtuple('StoredSnapshot', 'name, path, extension, ignore, recursive, stats, signature, files, saved')
+
+# Stored in PRAGMA user_version, older tables are dropped and created again
+SCHEMA_VERSION = 2
+
+
+class SnapshotStore:
+    r'''
+    Snapshot Store
+    --------------
+
+    Last known FileStats, directory signature (st_mtime_ns, st_ino) and file name set of
+    each path, kept in a SQLite file between runs.
+    File sets are stored as one zlib compressed blob per path (names separated by NUL,
+    which can not be part of a file name), None for recursive paths.
+    '''
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            name TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            extension TEXT NOT NULL,
+            ignore TEXT NOT NULL,
+            recursive INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            total_size INTEGER NOT NULL,
+            oldest_mtime REAL,
+            newest_mtime REAL,
+            mtime_ns INTEGER,
+            ino INTEGER,
+            files BLOB,
+            saved REAL NOT NULL
+        )
+    '''
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+
+
+    def __connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path)
+        if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            with connection:
+                connection.execute('DROP TABLE IF EXISTS snapshots')
+                connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        connection.execute(self.SCHEMA)
+        return connection
+
+
+    def load(self) -> dict:
+        r'''
+        Return {path name : StoredSnapshot}
+        '''
+        connection = self.__connect()
+        try:
+            rows = connection.execute('SELECT name, path, extension, ignore, recursive, count, total_size, oldest_mtime, newest_mtime, mtime_ns, ino, files, saved FROM snapshots').fetchall()
+        finally:
+            connection.close()
+        snapshots = {}
+        for name, path, extension, ignore, recursive, count, total_size, oldest_mtime, newest_mtime, mtime_ns, ino, files, saved in rows:
+            signature = (mtime_ns, ino) if mtime_ns is not None else None
+            stats = FileStats(count, total_size, oldest_mtime, newest_mtime)
+            snapshots[name] = StoredSnapshot(name, path, extension, ignore, bool(recursive), stats, signature, decode_files(files), saved)
+        logger.debug(f'{len(snapshots)} snapshots loaded from {self.db_path}')
+        return snapshots
+
+
+    def save(self, snapshots: list) -> None:
+        r'''
+        Replace the stored snapshots with the StoredSnapshot list in one transaction
+        '''
+        rows = [(snapshot.name, snapshot.path, snapshot.extension, snapshot.ignore, int(snapshot.recursive), *snapshot.stats,
+            *(snapshot.signature or (None, None)), encode_files(snapshot.files), snapshot.saved) for snapshot in snapshots]
+        connection = self.__connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM snapshots')
+                connection.executemany('INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        finally:
+            connection.close()
+        logger.debug(f'{len(rows)} snapshots saved to {self.db_path}')
+
+
+def encode_files(files: set | None) -> bytes | None:
+    if files is None:
+        return None
+    return zlib.compress('\0'.join(files).encode('utf-8', 'surrogateescape'))
+
+
+def decode_files(data: bytes | None) -> set | None:
+    if data is None:
+        return None
+    text = zlib.decompress(data).decode('utf-8', 'surrogateescape')
+    return set(text.split('\0')) if text else set()
+
+
+def snapshot_of(path_value: PathDetails, stats: FileStats, signature: tuple | None, files: set | None) -> StoredSnapshot:
+    return StoredSnapshot(path_value.name, path_value.path, path_value.extension, path_value.ignore, path_value.recursive, stats, signature, files, time())
+
+
+def matches(snapshot: StoredSnapshot, path_value: PathDetails) -> bool:
+    r'''
+    Stored snapshot was taken with the same path settings
+    '''
+    return (snapshot.path, snapshot.extension, snapshot.ignore, snapshot.recursive) == (path_value.path, path_value.extension, path_value.ignore, path_value.recursive)
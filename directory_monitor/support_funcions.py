@@ -1,10 +1,87 @@
-import logging, json_config, file_handler
-from classes import ConfigurationValues, TtkGeometry
+import logging, json_config, file_handler, metrics, tracing
+from snapshot_cache import DirectorySnapshotCache, SubtreeSnapshotCache
+from flow_rates import FlowRates
+from result_channel import ResultChannel
+from classes import ConfigurationValues, PathDetails, TtkGeometry
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from copy import deepcopy
+from time import perf_counter, time
 from re import search
 
 logger = logging.getLogger('suport_funcions')
 
+CONFIG_FILE = 'directory_monitor_config.json'
+SNAPSHOT_FILE = 'directory_monitor_snapshots.db'
+
+# Seconds the size and file ages of an unchanged directory are reused, files written in place
+# do not change the directory mtime so they are listed again after it
+STATS_MAX_AGE = 60
+
+# Shared by every update cycle, unchanged directories are not listed again
+path_cache = DirectorySnapshotCache(STATS_MAX_AGE)
+subtree_cache = SubtreeSnapshotCache(STATS_MAX_AGE)
+# Files in and out per minute from the listings of the scans
+flow_rates = FlowRates()
+
+
+configuration_template = '''
+{
+    "update_time" : "10",
+    "list_geometry" : {
+        "main" : [
+            "", 
+            "", 
+            0, 
+            0
+        ],
+        "settings" : [
+            "", 
+            "", 
+            0, 
+            0
+        ],
+        "edit" : [
+            "", 
+            "", 
+            0, 
+            0
+        ],
+        "list_view" : [
+            "", 
+            "", 
+            0, 
+            0
+        ]
+    },
+    "always_on_top" : "False",
+    "scan_workers" : "1",
+    "metrics_port" : "0",
+    "age_warning" : "0",
+    "age_critical" : "0",
+    "path_list" : [
+        {
+            "name" : "Template",
+            "path" : "./",
+            "extension" : "",
+            "ignore" : "",
+            "monitor_mode" : "watch",
+            "min_interval" : "0",
+            "max_interval" : "0",
+            "priority" : "0",
+            "recursive" : "False"
+        }
+    ]
+}
+'''
+
+
+def load_configuration() -> ConfigurationValues:
+    r'''
+    Load configuration file, created from template if missing
+    '''
+    config_values = json_config.load_json_config(CONFIG_FILE, configuration_template)
+    return ConfigurationValues.check_type_insertion(config_values)
+
 
 def update_win_size_pos(geometry_str:str, window_name: str, config: ConfigurationValues):
     r'''
@@ -26,11 +103,11 @@ def save_config_on_change(config: ConfigurationValues):
     Save to configuration file if it has changes
     '''
     try:
-        config_value = json_config.load_json_config('directory_monitor_config.json')
+        config_value = json_config.load_json_config(CONFIG_FILE)
         old_config = ConfigurationValues.check_type_insertion(config_value)
         if not config.__eq__(old_config):
             temp_config = deepcopy(config)
-            json_config.save_json_config('directory_monitor_config.json', temp_config.to_dict())
+            json_config.save_json_config(CONFIG_FILE, temp_config.to_dict())
     except Exception as error:
         logger.error(f'Could not save configuration values {error}')  
 
@@ -46,21 +123,200 @@ def check_win_pos(config: ConfigurationValues, win_name: str):
         return geometry_values
 
 
-def update_count(config : ConfigurationValues) -> None:
+def update_count(config : ConfigurationValues, channel: ResultChannel, path_list: list | None=None) -> dict:
+    r'''
+    Update files count in each directory in config object, publishing to channel
+    If path_list is informed, only those paths are updated
+    Return {path name : changed}, changed False when the directory was unchanged
+
+    With config.scan_workers above 1 the paths are listed in a thread pool,
+    each count is published as soon as its path is done
+    '''
+    path_list = config.path_list if path_list is None else path_list
+    cycle_start = perf_counter()
+    if config.scan_workers > 1 and len(path_list) > 1:
+        with ThreadPoolExecutor(max_workers=min(config.scan_workers, len(path_list)), thread_name_prefix='Scan') as executor:
+            futures = [executor.submit(__scan_path, path_value, channel) for path_value in path_list]
+            results = [future.result() for future in as_completed(futures)]
+    else:
+        results = [__scan_path(path_value, channel) for path_value in path_list]
+    cycle_time = perf_counter() - cycle_start
+    metrics.cycle_duration.observe(cycle_time)
+    sequential_time = sum(duration for _, duration, _ in results)
+    logger.debug(f'Cycle time {cycle_time:.3f}s for {len(path_list)} paths, sequential {sequential_time:.3f}s, workers {config.scan_workers}')
+    logger.debug(f'Snapshot cache {path_cache.stats()}, subtree cache {subtree_cache.stats()}')
+    return {path_name : changed for path_name, _, changed in results}
+
+
+def __scan_path(path_value: PathDetails, channel: ResultChannel) -> tuple:
+    r'''
+    Count and publish a single path
+    Return (path name, time spent, changed)
+    '''
+    if tracing.tracer.enabled:
+        return __scan_path_traced(path_value, channel)
+    start = perf_counter()
+    changed = True
+    try:
+        if path_value.recursive:
+            stats, changed, breakdown = subtree_cache.count_changed(path_value, flow_stats_directory)
+            __publish_result(path_value, channel, stats, perf_counter() - start, breakdown)
+        else:
+            stats, changed = path_cache.count_changed(path_value, flow_path_stats)
+            __publish_result(path_value, channel, stats, perf_counter() - start)
+    except Exception as error:
+        metrics.scan_errors.inc(label_value=path_value.name)
+        logger.error(f'Update count error {error}')
+    return path_value.name, perf_counter() - start, changed
+
+
+def __scan_path_traced(path_value: PathDetails, channel: ResultChannel) -> tuple:
+    r'''
+    Same as __scan_path recording the time of each stage in the tracer
+    cache is the directory stat and lookup, list / extension / ignore / stat only happen on cache miss
+    Recursive paths record the whole subtree count as list
+    '''
+    stages = {}
+    def staged_counter(path_value: PathDetails) -> file_handler.FileStats:
+        keys = set()
+        stats, stage_times = file_handler.file_stats_staged(path_value.path, path_value.extension, path_value.ignore_regex, keys)
+        stages.update(stage_times)
+        diff_start = perf_counter()
+        flow_rates.observe(path_value.name, path_value.path, keys)
+        stages['diff'] = perf_counter() - diff_start
+        return stats
+    start = perf_counter()
+    changed = True
+    try:
+        breakdown = None
+        if path_value.recursive:
+            stats, changed, breakdown = subtree_cache.count_changed(path_value, flow_stats_directory)
+            stages['list'] = perf_counter() - start
+        else:
+            stats, changed = path_cache.count_changed(path_value, staged_counter)
+        counted = perf_counter()
+        stages['cache'] = counted - start - sum(stages.values())
+        __publish_result(path_value, channel, stats, counted - start, breakdown)
+        stages['publish'] = perf_counter() - counted
+        tracing.tracer.record(path_value.name, stages)
+    except Exception as error:
+        metrics.scan_errors.inc(label_value=path_value.name)
+        logger.error(f'Update count error {error}')
+    return path_value.name, perf_counter() - start, changed
+
+
+def __publish_result(path_value: PathDetails, channel: ResultChannel, stats: file_handler.FileStats, duration: float, breakdown: dict | None=None) -> None:
+    rates = flow_rates.update(path_value.name, time())
+    channel.publish_count(path_value.name, stats.count, duration, breakdown, stats, rates)
+    metrics.path_files.set(stats.count, path_value.name)
+    if rates is not None:
+        metrics.path_arrival_rate.set(rates[0], path_value.name)
+        metrics.path_departure_rate.set(rates[1], path_value.name)
+    metrics.path_bytes.set(stats.total_size, path_value.name)
+    if stats.oldest_mtime is not None:
+        metrics.path_oldest_file.set(stats.oldest_mtime, path_value.name)
+    else:
+        metrics.path_oldest_file.remove(path_value.name)
+    metrics.scan_duration.observe(duration, path_value.name)
+
+
+def count_files(path_value: PathDetails) -> int:
+    r'''
+    Count files matching extension and ignore pattern for the path
+    '''
+    return file_handler.count_files(path_value.path, path_value.extension, path_value.ignore_regex)
+
+
+def path_stats(path_value: PathDetails) -> file_handler.FileStats:
+    r'''
+    Count, total size, oldest and newest mtime of the files matching the path, in one listing
+    '''
+    return file_handler.file_stats(path_value.path, path_value.extension, path_value.ignore_regex)
+
+
+def flow_path_stats(path_value: PathDetails) -> file_handler.FileStats:
+    r'''
+    Same as path_stats, diffing the listing with the previous one for the flow rates
+    '''
+    keys = set()
+    stats = file_handler.file_stats(path_value.path, path_value.extension, path_value.ignore_regex, keys)
+    flow_rates.observe(path_value.name, path_value.path, keys)
+    return stats
+
+
+def format_size(size: int) -> str:
+    r'''
+    Bytes to a short text, 1536 to '1.5 KB'
+    '''
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            return f'{size} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+def format_age(seconds: float) -> str:
+    r'''
+    Elapsed seconds to a short text, 5400 to '1h 30m'
+    '''
+    minutes = max(0, int(seconds // 60))
+    if minutes < 60:
+        return f'{minutes}m'
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f'{hours}h {minutes:02d}m'
+    days, hours = divmod(hours, 24)
+    return f'{days}d {hours:02d}h'
+
+
+def file_names(path_value: PathDetails) -> list:
+    r'''
+    Names of the files counted for the path
+    '''
+    return file_handler.matching_names(path_value.path, path_value.extension, path_value.ignore_regex)
+
+
+def stats_directory(directory: str, path_value: PathDetails, keys: set | None=None) -> tuple:
+    r'''
+    List one directory of a recursive path, return (FileStats, sub directory paths)
+    The path itself is created if missing, like in count_files
+    '''
+    if directory == path_value.path:
+        file_handler.check_create_dir(directory)
+    return file_handler.file_stats_subdirs(directory, path_value.extension, path_value.ignore_regex, keys)
+
+
+def flow_stats_directory(directory: str, path_value: PathDetails) -> tuple:
+    r'''
+    Same as stats_directory, diffing the listing with the previous one for the flow rates
+    '''
+    keys = set()
+    result = stats_directory(directory, path_value, keys)
+    flow_rates.observe(path_value.name, directory, keys)
+    return result
+
+
+def file_matches(path_value: PathDetails, file_name: str) -> bool:
+    r'''
+    Check if a single file name would be counted for the path
+    '''
+    if not file_name.lower().endswith(f'.{path_value.extension.lower()}'):
+        return False
+    if path_value.ignore_regex and path_value.ignore_regex.search(file_name):
+        return False
+    return True
+
+
+def diff_path_list(old_list: list, new_list: list) -> tuple:
     r'''
-    Update files count in each directory in config object
+    Compare path lists by name
+    Return (added, removed, changed), changed as (old, new) PathDetails tuples
     '''
-    for path_value in config.path_list:
-        try:
-            file_list = file_handler.file_list(path_value.path, path_value.extension)
-            if path_value.ignore:
-                for file_name in file_list:
-                    if reg_ex_ignore(path_value.ignore, file_name):
-                        file_list.remove(file_name)
-            logger.info(f'<PATH>path_name:{path_value.name},quantity:{len(file_list)}')
-        except Exception as error:
-            logger.error(f'Update count error {error}')
-    return
+    old_paths = {path_value.name : path_value for path_value in old_list}
+    new_paths = {path_value.name : path_value for path_value in new_list}
+    added = [path_value for name, path_value in new_paths.items() if not name in old_paths]
+    removed = [path_value for name, path_value in old_paths.items() if not name in new_paths]
+    changed = [(old_paths[name], path_value) for name, path_value in new_paths.items() if name in old_paths and not old_paths[name] == path_value]
+    return added, removed, changed
 
 
 def reg_ex_ignore(reg_ex: str, search_value: str) -> bool:
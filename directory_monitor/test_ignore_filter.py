@@ -0,0 +1,84 @@
+import os, re, shutil, tempfile, unittest, support_funcions
+from time import perf_counter
+from classes import ConfigurationValues, PathDetails
+from result_channel import ResultChannel
+
+
+def create_files(directory: str, names) -> None:
+    for name in names:
+        os.close(os.open(os.path.join(directory, name), os.O_CREAT | os.O_WRONLY, 0o644))
+
+
+class IgnorePatternTest(unittest.TestCase):
+    r'''
+    Compiled ignore pattern of PathDetails and the single pass filter of the scans
+    Counts go through update_count, as the monitor does, with a cold snapshot cache
+    '''
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp(prefix='dm_test_')
+        support_funcions.path_cache.clear()
+        support_funcions.flow_rates.clear()
+
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+    def update_count(self, config: ConfigurationValues) -> dict:
+        r'''
+        Scan the config paths, return {path name : published count}
+        '''
+        channel = ResultChannel()
+        support_funcions.update_count(config, channel)
+        return {count_event.path_name : count_event.count for count_event in channel.drain()}
+
+
+    def test_pattern_compiled_once(self):
+        path_value = PathDetails('Test', self.directory, 'pdf', '^IGN_')
+        regex = path_value.ignore_regex
+        self.assertIs(path_value.ignore_regex, regex)
+        path_value.ignore = '^TMP_'
+        self.assertEqual(path_value.ignore_regex.pattern, '^TMP_')
+        path_value.ignore = ''
+        self.assertIsNone(path_value.ignore_regex)
+
+
+    def test_adjacent_matches(self):
+        # The old remove() while iterating skipped the entry after each removed one
+        create_files(self.directory, ['IGN_1.pdf', 'IGN_2.pdf', 'IGN_3.pdf', 'a.pdf', 'IGN_4.pdf', 'IGN_5.pdf', 'b.PDF', 'c.txt', 'IGN_6.txt'])
+        path_value = PathDetails('Test', self.directory, 'pdf', '^IGN_')
+        self.assertEqual(self.update_count(ConfigurationValues(10, {}, False, [path_value])), {'Test' : 2})
+        self.assertEqual(sorted(support_funcions.file_names(path_value)), ['a.pdf', 'b.PDF'])
+        self.assertFalse(support_funcions.file_matches(path_value, 'IGN_7.pdf'))
+        self.assertTrue(support_funcions.file_matches(path_value, 'd.pdf'))
+
+
+    def test_invalid_pattern_keeps_other_paths(self):
+        config = ConfigurationValues.check_type_insertion({'update_time' : '10', 'list_geometry' : {}, 'always_on_top' : 'False', 'path_list' : [
+            {'name' : 'Broken', 'path' : self.directory, 'extension' : 'pdf', 'ignore' : '[IGN'},
+            {'name' : 'Valid', 'path' : self.directory, 'extension' : 'pdf', 'ignore' : '^IGN_'}]})
+        broken, valid = config.path_list
+        self.assertEqual(broken.ignore, '[IGN')
+        self.assertEqual(broken.to_dict()['ignore'], '[IGN')
+        with self.assertRaises(re.error):
+            broken.ignore_regex
+        # The broken path is logged and not published, the valid one is still counted
+        with self.assertLogs('suport_funcions', 'ERROR'):
+            self.assertEqual(self.update_count(config), {'Valid' : 0})
+        with self.assertRaises(re.error):
+            PathDetails('Test', self.directory, 'pdf', '[IGN')
+
+
+    def test_timing_100k_files(self):
+        # Half of the names ignored, the quadratic filter took about 18s here
+        create_files(self.directory, [f'{"IGN_" if index % 2 else "FILE_"}{index:06d}.pdf' for index in range(100000)])
+        config = ConfigurationValues(10, {}, False, [PathDetails('Test', self.directory, 'pdf', '^IGN_')])
+        start = perf_counter()
+        counts = self.update_count(config)
+        elapsed = perf_counter() - start
+        self.assertEqual(counts, {'Test' : 50000})
+        self.assertLess(elapsed, 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os, shutil, tempfile, unittest, inotify_watcher
+from classes import PathDetails
+
+
+def create_files(directory: str, names) -> None:
+    for name in names:
+        os.close(os.open(os.path.join(directory, name), os.O_CREAT | os.O_WRONLY, 0o644))
+
+
+@unittest.skipUnless(inotify_watcher.inotify_available(), 'inotify not available')
+class DirectoryWatcherTest(unittest.TestCase):
+    r'''
+    Counts kept from inotify events
+    '''
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp(prefix='dm_test_')
+        self.watcher = inotify_watcher.DirectoryWatcher()
+
+
+    def tearDown(self) -> None:
+        self.watcher.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+    def read_all(self) -> dict:
+        changed = {}
+        while True:
+            events = self.watcher.read_events(0.2)
+            if not events:
+                return changed
+            changed.update(events)
+
+
+    def test_rename_over_existing_name(self):
+        create_files(self.directory, ['a.pdf', 'tmp.part'])
+        path_value = PathDetails('PDF', self.directory, 'pdf', '')
+        self.assertEqual(self.watcher.watch([path_value]), [])
+        os.rename(os.path.join(self.directory, 'tmp.part'), os.path.join(self.directory, 'a.pdf'))
+        create_files(self.directory, ['b.pdf'])
+        self.assertEqual(self.read_all(), {'PDF' : 2})
+
+
+    def test_two_paths_on_one_directory(self):
+        pdf_path = PathDetails('PDF', self.directory, 'pdf', '')
+        xml_path = PathDetails('XML', self.directory, 'xml', '')
+        self.assertEqual(self.watcher.watch([pdf_path, xml_path]), [])
+        create_files(self.directory, ['a.pdf', 'b.xml', 'c.xml'])
+        self.assertEqual(self.read_all(), {'PDF' : 1, 'XML' : 2})
+        # Removing one path keeps the shared watch for the other
+        self.watcher.remove_path('XML')
+        create_files(self.directory, ['d.pdf', 'e.xml'])
+        self.assertEqual(self.read_all(), {'PDF' : 2})
+        self.assertEqual(self.watcher.counts, {'PDF' : 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
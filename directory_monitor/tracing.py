@@ -0,0 +1,122 @@
+import logging
+from collections import namedtuple, deque
+from threading import Lock
+from time import time
+
+logger = logging.getLogger('tracing')
+
+
+StageTiming = namedtuple('StageTiming', 'path_name, stage, duration, timestamp')
+
+# Stages of a path scan, in order
+SCAN_STAGES = ('cache', 'list', 'extension', 'ignore', 'stat', 'diff', 'publish')
+
+
+class LogSink:
+    r'''
+    Write every stage timing to the log at the informed level
+    '''
+    def __init__(self, level: int=logging.DEBUG) -> None:
+        self.level = level
+
+
+    def __call__(self, timing: StageTiming) -> None:
+        logger.log(self.level, f'{timing.path_name} {timing.stage} {timing.duration * 1000:.3f}ms')
+
+
+class RingSink:
+    r'''
+    Keep the last capacity stage timings in memory
+    '''
+    def __init__(self, capacity: int=1000) -> None:
+        self.timings = deque(maxlen=capacity)
+
+
+    def __call__(self, timing: StageTiming) -> None:
+        self.timings.append(timing)
+
+
+    def snapshot(self) -> list:
+        return list(self.timings)
+
+
+class ScanTracer:
+    r'''
+    Scan Tracer
+    -----------
+
+    Timing of each scan stage sent to pluggable sinks, any callable receiving
+    a StageTiming (LogSink, RingSink or a plain function).
+    With no sink the tracer is disabled and scans take the untraced path,
+    the only cost left is checking enabled once per path scan.
+    While enabled, a per path summary of calls, total and max time by stage is kept.
+    '''
+    def __init__(self) -> None:
+        self.sinks = []
+        self.summaries = {}
+        self.lock = Lock()
+        self.enabled = False
+
+
+    def add_sink(self, sink) -> None:
+        with self.lock:
+            self.sinks.append(sink)
+            self.enabled = True
+
+
+    def remove_sink(self, sink) -> None:
+        with self.lock:
+            self.sinks.remove(sink)
+            self.enabled = bool(self.sinks)
+
+
+    def record(self, path_name: str, stages: dict) -> None:
+        r'''
+        Record {stage : seconds} of one path scan
+        '''
+        timestamp = time()
+        with self.lock:
+            sinks = list(self.sinks)
+            summary = self.summaries.setdefault(path_name, {})
+            for stage, duration in stages.items():
+                calls, total, maximum = summary.get(stage, (0, 0.0, 0.0))
+                summary[stage] = (calls + 1, total + duration, max(maximum, duration))
+        for stage, duration in stages.items():
+            timing = StageTiming(path_name, stage, duration, timestamp)
+            for sink in sinks:
+                try:
+                    sink(timing)
+                except Exception as error:
+                    logger.error(f'Trace sink error {error}')
+
+
+    def summary(self, path_name: str | None=None) -> dict:
+        r'''
+        {path name : {stage : (calls, total seconds, max seconds)}}, one path if informed
+        '''
+        with self.lock:
+            if path_name is not None:
+                return {path_name : dict(self.summaries.get(path_name, {}))}
+            return {name : dict(stages) for name, stages in self.summaries.items()}
+
+
+    def format_summary(self) -> str:
+        r'''
+        Text table of the summary, share of the scan time per stage
+        '''
+        lines = []
+        for path_name, stages in self.summary().items():
+            scan_total = sum(total for _, total, _ in stages.values()) or 1
+            stage_text = ', '.join(f'{stage} {total / scan_total:.0%} ({total / calls * 1000:.3f}ms avg, {maximum * 1000:.3f}ms max)'
+                for stage, (calls, total, maximum) in sorted(stages.items(), key=lambda item : SCAN_STAGES.index(item[0]) if item[0] in SCAN_STAGES else len(SCAN_STAGES)))
+            lines.append(f'{path_name}: {stage_text}')
+        return '\n'.join(lines)
+
+
+    def reset(self) -> None:
+        with self.lock:
+            self.summaries.clear()
+
+
+# Shared by the scanner modules
+tracer = ScanTracer()